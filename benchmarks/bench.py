@@ -0,0 +1,260 @@
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from DarshanInfo import DarshanInfo
+from synthetic import synthetic_file
+
+"""
+This is the benchmark of the features on synthetic traces (see synthetic.py) : for each case of a sweep,
+it reports the wall time and the peak memory (traced by tracemalloc, in a second run) of the conversion of the records and of each feature,
+the binning of a feature (e.g. bin_io for dxt_posix) and the rendering of its figures ("<feature> render") are separate stages.
+
+Usage: python benchmarks/bench.py [-sweep <sweep>] [-save <baseline>] [-compare <baseline>] [-tolerance <ratio>] [global options]
+    - sweep : the name of the sweep (see SWEEPS), by default it is small
+    - save : saves the results as the baseline benchmarks/baselines/<baseline>.json
+    - compare : compares the results to a baseline, the exit code is 1 if a time or a peak memory is above tolerance times the baseline
+    - tolerance : 1.25 by default
+    - the other options are the global options of DarshanInfo (e.g. -jobs 4, -raster)
+"""
+
+BASELINES = os.path.join(os.path.dirname(__file__), "baselines")
+SWEEPS = {
+    "small": [
+        {"nprocs": 16, "nfiles": 4, "nhosts": 2, "segments": 100},
+        {"nprocs": 64, "nfiles": 16, "nhosts": 4, "segments": 100},
+        {"nprocs": 256, "nfiles": 64, "nhosts": 8, "segments": 100},
+    ],
+    "medium": [
+        {"nprocs": 1024, "nfiles": 64, "nhosts": 32, "segments": 200},
+        {"nprocs": 4096, "nfiles": 256, "nhosts": 128, "segments": 200},
+    ],
+    "large": [
+        {"nprocs": 16384, "nfiles": 1024, "nhosts": 512, "segments": 200},
+        {"nprocs": 65536, "nfiles": 4096, "nhosts": 2048, "segments": 100},
+    ],
+    "skew": [
+        {"nprocs": 256, "nfiles": 64, "nhosts": 8, "segments": 100, "skew": 0.0},
+        {"nprocs": 256, "nfiles": 64, "nhosts": 8, "segments": 100, "skew": 100.0},
+        {"nprocs": 256, "nfiles": 64, "nhosts": 8, "segments": 100, "skew": 1000.0},
+    ],
+}
+# the differences below these are noise, they are not regressions
+NOISE = {"time": 0.05, "peak_mb": 1.0}
+# the features : the method that computes the matrices, the method that renders them and the options of parse_feature_options
+FEATURES = (
+    ("dxt_posix", "bin_io", "to_heatmap", {"groups": True, "top": True}),
+    ("nb_rank_file", "ranks_per_file", "to_heatmap", {"top": True}),
+    ("aggregate_info", "aggregate", "to_plot", {"downsample": False}),
+    ("concurrency", "concurrency", "to_plot", {"downsample": False}),
+)
+
+
+def case_name(options):
+    return ",".join("{}={}".format(k, v) for k, v in sorted(options.items()))
+
+
+def measure(function, memory):
+    """
+    Returns (the wall time in seconds, the peak memory in MB or None) of function(), its output is discarded
+    """
+    if memory:
+        tracemalloc.start()
+    start_t = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        function()
+    elapsed = time.perf_counter() - start_t
+    peak = None
+    if memory:
+        peak = tracemalloc.get_traced_memory()[1] / (1 << 20)
+        tracemalloc.stop()
+    return elapsed, peak
+
+
+def run_case(options, global_options, output, memory):
+    """
+    Runs the conversion and the features on a synthetic trace, returns {stage: {"time": sec, "peak_mb": MB}}
+    """
+    f = synthetic_file(**options)
+    info = None
+    matrices = None
+
+    def convert():
+        nonlocal info
+        f.get_dxt_posix()
+        f.get_posix()
+        info = DarshanInfo(["bench.py", f.path] + global_options, files=[f])
+
+    def compute(name, method, kwargs):
+        nonlocal matrices
+        info.argv = ["bench.py", f.path, name, "-output", output]
+        info.i = 3
+        feature_options, levels = info.parse_feature_options(**kwargs)
+        info.set_feature_options(feature_options, levels)
+        matrices = getattr(info, method)()
+
+    def render(method):
+        info.render_levels(matrices, method)
+        info.close()
+
+    def metadata():
+        # (the metadata are written while they are computed)
+        info.argv = ["bench.py", f.path, "metadata"]
+        info.i = 2
+        info.metadata_without_IO()
+
+    stages = [("convert", convert)]
+    for name, method, render_method, kwargs in FEATURES:
+        stages.append(
+            (
+                name,
+                lambda name=name, method=method, kwargs=kwargs: compute(
+                    name, method, kwargs
+                ),
+            )
+        )
+        stages.append(
+            (
+                name + " render",
+                lambda render_method=render_method: render(render_method),
+            )
+        )
+    stages.append(("metadata", metadata))
+
+    results = dict()
+    for name, stage in stages:
+        elapsed, _ = measure(stage, False)
+        results[name] = {"time": elapsed}
+    if memory:
+        # a second run, the tracing of the allocations slows down the first one
+        f = synthetic_file(**options)
+        for name, stage in stages:
+            _, peak = measure(stage, True)
+            results[name]["peak_mb"] = peak
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Prints the ratios of the results to the baseline, returns the number of regressions
+    """
+    regressions = 0
+    for case, stages in results.items():
+        if case not in baseline:
+            print("{} is not in the baseline".format(case))
+            continue
+        for stage, values in stages.items():
+            for k, v in values.items():
+                base = baseline[case].get(stage, dict()).get(k)
+                if not base or v is None:
+                    continue
+                ratio = v / base
+                flag = ""
+                if ratio > tolerance and v - base > NOISE[k]:
+                    flag = "REGRESSION"
+                    regressions += 1
+                print(
+                    "{:<60} {:<22} {:<8} {:>10.3f} {:>10.3f} {:>7.2f}x {}".format(
+                        case, stage, k, base, v, ratio, flag
+                    )
+                )
+    return regressions
+
+
+def main():
+    argv = sys.argv[1:]
+    sweep = "small"
+    save = None
+    baseline = None
+    tolerance = 1.25
+    memory = True
+    global_options = list()
+    i = 0
+    while i < len(argv):
+        if argv[i] == "-sweep":
+            sweep = argv[i + 1]
+            i += 2
+        elif argv[i] == "-save":
+            save = argv[i + 1]
+            i += 2
+        elif argv[i] == "-compare":
+            baseline = argv[i + 1]
+            i += 2
+        elif argv[i] == "-tolerance":
+            tolerance = float(argv[i + 1])
+            i += 2
+        elif argv[i] == "-no-memory":
+            memory = False
+            i += 1
+        else:
+            global_options.append(argv[i])
+            i += 1
+
+    results = dict()
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        # the features write in output/ (metadata always does)
+        os.chdir(directory)
+        os.makedirs("output")
+        output = os.path.join("output", "bench")
+        for options in SWEEPS[sweep]:
+            case = case_name(options)
+            results[case] = run_case(options, global_options, output, memory)
+            print(case)
+            for stage, values in results[case].items():
+                print(
+                    "    {:<22} {:>8.3f} sec {}".format(
+                        stage,
+                        values["time"],
+                        (
+                            "{:>9.1f} MB".format(values["peak_mb"])
+                            if "peak_mb" in values
+                            else ""
+                        ),
+                    )
+                )
+        os.chdir(cwd)
+
+    if save is not None:
+        os.makedirs(BASELINES, exist_ok=True)
+        path = os.path.join(BASELINES, save + ".json")
+        with open(path, "w") as out:
+            json.dump(
+                {
+                    "machine": {
+                        "platform": platform.platform(),
+                        "python": platform.python_version(),
+                        "cpus": os.cpu_count(),
+                    },
+                    "sweep": sweep,
+                    "options": global_options,
+                    "results": results,
+                },
+                out,
+                indent=4,
+            )
+        print("Save the baseline {}".format(path))
+
+    if baseline is not None:
+        with open(os.path.join(BASELINES, baseline + ".json")) as base:
+            regressions = compare(results, json.load(base)["results"], tolerance)
+        print("{} regressions".format(regressions))
+        if regressions != 0:
+            sys.exit(1)
+    return
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from DarshanInfo import DarshanInfo
+from synthetic import synthetic_file
+
+"""
+This is the benchmark of the start of the command line : for each entry path, main.py is run in a new process
+and it reports the wall time of the process, and the time spent in the imports and the heaviest imports (with python -X importtime).
+
+Usage: python benchmarks/startup.py [<darshan file>] [-repeat <number of runs>]
+    - the entry paths are the usage (--help) and replot (with and without -raster) of the data of a synthetic trace,
+      and with a darshan file, its features (metadata, dxt_posix and nb_rank_file with and without -raster)
+    - repeat : each entry path is run several times and the fastest run is reported (3 by default)
+"""
+
+MAIN = os.path.join(os.path.dirname(__file__), "..", "src", "main.py")
+
+
+def import_times(stderr):
+    """
+    Returns {module: cumulative time in seconds} of the top level imports in the output of python -X importtime
+    """
+    times = dict()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, module = line[len("import time:") :].split("|")
+        # the nested imports are indented
+        if module.startswith("  "):
+            continue
+        times[module.strip()] = int(cumulative) / 1e6
+    return times
+
+
+def run(args, directory):
+    """
+    Returns (the wall time, the import times) of main.py args : the wall time of a new process,
+    and the import times of a second one with -X importtime (the tracing of the imports slows them down)
+    """
+    env = dict(os.environ)
+    env.pop("MPLBACKEND", None)
+    start_t = time.perf_counter()
+    subprocess.run(
+        [sys.executable, MAIN] + args, cwd=directory, env=env, capture_output=True
+    )
+    wall = time.perf_counter() - start_t
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", MAIN] + args,
+        cwd=directory,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        print(result.stderr.splitlines()[-1])
+    return wall, import_times(result.stderr)
+
+
+def save_replot_data(directory):
+    """
+    Saves the data of the features of a small synthetic trace (-save-data) for the replot entry paths
+    """
+    cwd = os.getcwd()
+    os.chdir(directory)
+    os.makedirs("output", exist_ok=True)
+    f = synthetic_file(nprocs=64, nfiles=8, nhosts=4, segments=20)
+    info = DarshanInfo(["startup.py", f.path, "-save-data", "-raster"], files=[f])
+    info.argv = ["startup.py", f.path, "dxt_posix", "rank", "write"]
+    info.i = 2
+    info.dxt_posix_heatmap()
+    os.chdir(cwd)
+    return os.path.join(directory, "output")
+
+
+def main():
+    argv = sys.argv[1:]
+    repeat = 3
+    darshan_file = None
+    i = 0
+    while i < len(argv):
+        if argv[i] == "-repeat":
+            repeat = int(argv[i + 1])
+            i += 2
+        else:
+            darshan_file = os.path.abspath(argv[i])
+            i += 1
+
+    with tempfile.TemporaryDirectory() as directory:
+        data = save_replot_data(directory)
+        os.makedirs(os.path.join(directory, "output"), exist_ok=True)
+        paths = [
+            ("--help", ["--help"]),
+            ("replot -raster", ["replot", data, "-raster", "-output", "replot"]),
+            ("replot", ["replot", data, "-output", "replot"]),
+        ]
+        if darshan_file is not None:
+            paths += [
+                ("metadata", [darshan_file, "metadata"]),
+                ("nb_rank_file -raster", [darshan_file, "nb_rank_file", "-raster"]),
+                ("dxt_posix -raster", [darshan_file, "dxt_posix", "-raster"]),
+                ("dxt_posix", [darshan_file, "dxt_posix"]),
+            ]
+
+        print(
+            "{:<25} {:>10} {:>10}   {}".format(
+                "entry path", "wall", "imports", "heaviest imports"
+            )
+        )
+        for name, args in paths:
+            runs = [run(args, directory) for _ in range(repeat)]
+            wall, times = min(runs, key=lambda run: run[0])
+            heaviest = sorted(times.items(), key=lambda item: -item[1])[:3]
+            print(
+                "{:<25} {:>8.3f} s {:>8.3f} s   {}".format(
+                    name,
+                    wall,
+                    sum(times.values()),
+                    ", ".join(
+                        "{} {:.3f} s".format(module, t) for module, t in heaviest
+                    ),
+                )
+            )
+    return
+
+
+if __name__ == "__main__":
+    main()
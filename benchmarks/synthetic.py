@@ -0,0 +1,137 @@
+import datetime
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from DarshanFile import DarshanFile
+
+"""
+This module generates synthetic darshan reports (DXT_POSIX and POSIX records), it is a local stand-in for the reports of pydarshan
+that can be given to DarshanFile, so that the features can be run and measured at any scale without darshan logs.
+
+The options of a trace are :
+    - nprocs : the number of ranks
+    - nfiles : the number of files, each rank reads and writes the file rank % nfiles
+    - nhosts : the number of hosts, the ranks are spread by blocks over the hosts
+    - segments : the number of segments (I/O) per rank, half of them are writes
+    - skew : the maximum delay (in seconds) of the I/O of a rank compared to the other ranks
+    - duration : the duration of the I/O phase of a rank (in seconds)
+    - meta : the number of records per rank that only have metadata operations (for MetadataWithout_IO)
+"""
+
+POSIX_COUNTERS = (
+    "POSIX_OPENS",
+    "POSIX_READS",
+    "POSIX_WRITES",
+    "POSIX_SEEKS",
+    "POSIX_STATS",
+)
+POSIX_FCOUNTERS = ("POSIX_F_READ_TIME", "POSIX_F_WRITE_TIME", "POSIX_F_META_TIME")
+
+
+class SyntheticRecords:
+    """
+    The POSIX records of a synthetic report, like the record collections of pydarshan
+    """
+
+    def __init__(self, counters, fcounters):
+        self.counters = counters
+        self.fcounters = fcounters
+
+    def to_df(self):
+        return {"counters": self.counters, "fcounters": self.fcounters}
+
+
+class SyntheticReport:
+    def __init__(
+        self,
+        nprocs=16,
+        nfiles=4,
+        nhosts=2,
+        segments=100,
+        skew=1.0,
+        duration=100.0,
+        meta=1,
+        seed=0,
+    ):
+        rng = np.random.default_rng(seed)
+        self.start_time = datetime.datetime(2024, 1, 1)
+        self.end_time = self.start_time + datetime.timedelta(
+            seconds=int(np.ceil(duration + skew))
+        )
+        self.metadata = {"job": {"nprocs": nprocs}}
+        self.modules = ["POSIX", "DXT_POSIX"]
+
+        file_ids = rng.integers(1, 1 << 63, nfiles, dtype=np.int64).astype(np.uint64)
+        hostnames = ["host-{:04d}".format(h) for h in range(nhosts)]
+        delays = rng.random(nprocs) * skew
+
+        dxt = list()
+        counters = {k: list() for k in ("id", "rank") + POSIX_COUNTERS}
+        fcounters = {k: list() for k in ("id", "rank") + POSIX_FCOUNTERS}
+        for rank in range(nprocs):
+            nwrite = segments // 2
+            nread = segments - nwrite
+            start = np.sort(rng.random(segments)) * duration + delays[rank]
+            end = start + rng.exponential(duration / segments / 4, segments)
+            length = rng.integers(1, 1 << 20, segments)
+            offset = np.cumsum(length) - length
+            op = rng.permutation(np.arange(segments) < nwrite)
+            record = {
+                "id": int(file_ids[rank % nfiles]),
+                "rank": rank,
+                "hostname": hostnames[rank * nhosts // nprocs],
+                "write_count": nwrite,
+                "read_count": nread,
+            }
+            for name, mask in (("write_segments", op), ("read_segments", ~op)):
+                record[name] = [
+                    {"offset": o, "length": l, "start_time": s, "end_time": e}
+                    for o, l, s, e in zip(
+                        offset[mask].tolist(),
+                        length[mask].tolist(),
+                        start[mask].tolist(),
+                        end[mask].tolist(),
+                    )
+                ]
+            dxt.append(record)
+
+            # the record of the I/O, then the records with only metadata operations
+            ids = [record["id"]] + rng.integers(1, 1 << 63, meta).tolist()
+            for i, id in enumerate(ids):
+                counters["id"].append(id)
+                counters["rank"].append(rank)
+                counters["POSIX_OPENS"].append(int(rng.integers(1, 4)))
+                counters["POSIX_READS"].append(nread if i == 0 else 0)
+                counters["POSIX_WRITES"].append(nwrite if i == 0 else 0)
+                counters["POSIX_SEEKS"].append(int(rng.integers(0, 2)) * segments)
+                counters["POSIX_STATS"].append(int(rng.integers(0, 3)))
+                fcounters["id"].append(id)
+                fcounters["rank"].append(rank)
+                fcounters["POSIX_F_READ_TIME"].append(
+                    float(np.sum(end[~op] - start[~op])) if i == 0 else 0.0
+                )
+                fcounters["POSIX_F_WRITE_TIME"].append(
+                    float(np.sum(end[op] - start[op])) if i == 0 else 0.0
+                )
+                fcounters["POSIX_F_META_TIME"].append(float(rng.random()) * 1e-3)
+
+        counters = pd.DataFrame(counters)
+        fcounters = pd.DataFrame(fcounters)
+        for df in (counters, fcounters):
+            df["id"] = df["id"].astype(np.uint64)
+        self.records = {
+            "DXT_POSIX": dxt,
+            "POSIX": SyntheticRecords(counters, fcounters),
+        }
+
+
+def synthetic_file(name="synthetic.darshan", **options):
+    """
+    Returns a DarshanFile of a synthetic report (see SyntheticReport for the options)
+    """
+    return DarshanFile(name, report=SyntheticReport(**options))
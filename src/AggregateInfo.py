@@ -1,100 +1,129 @@
-import array
-import scipy.sparse as sp
-import matplotlib.pyplot as plt
-import pandas as pd
 import numpy as np
 
-from SparseMatrix import SparseMatrix
+from Binning import bin_contributions
+from MatrixData import save_data
 
 
 class AggregateInfo:
-    def __init__(self, info):
-        self.size = info.nbins
+    def __init__(self, info, load=True, factor=1):
+        """
+        The bins of the plot are factor bins of info (see DarshanInfo.render_levels), each level is binned from the segments
+        (a segment is counted once in a bin, whatever the number of finer bins it covers)
+        """
+        self.op = info.op
+        self.factor = factor
+        self.size = -(-info.nbins // factor)
         # self.v = array.array('L')
         # self.v_bw = array.array('d')
         # self.v_meta = array.array('d')
         self.v = np.zeros(self.size, dtype=np.uint64)
         self.v_bw = np.zeros(self.size, dtype=np.float64)
         self.v_meta = np.zeros(self.size, dtype=np.float64)
-        self.get_data(info)
+        if load:
+            self.get_data(info)
 
     def get_data(self, info):
-        op_segment = info.op + "_segments"
-        temps_nprocs = 0
-
-        for f in info.files:
-            posix = pd.merge(
-                f.posix["counters"], f.posix["fcounters"], on=["id", "rank"]
-            )
-            meta_time = posix[
-                ((posix["POSIX_READS"] != 0) | (posix["POSIX_WRITES"] != 0))
-            ]
-            meta_time = meta_time.set_index(["id", "rank"])[
-                "POSIX_F_META_TIME"
-            ].to_dict()
-
-            for e in f.dxt_posix:
-                meta = meta_time.get((e["id"], e["rank"]), 0) / (
-                    e["read_count"] + e["write_count"]
-                )
-                if meta == 0:
-                    print(
-                        "meta time has not been found for ({}, {})".format(
-                            e["id"], e["rank"]
-                        )
-                    )
-                if not e[op_segment].empty:
-                    df = e[op_segment]
-                    for line in df.values:
-                        idx_beg = int(line[2] // info.step)
-                        # duration = line[3] - line[2]
-                        idx_end = int(line[3] // info.step)
-                        # length = int(duration // info.step + 1)
-                        length = idx_end - idx_beg + 1
-                        if idx_beg + length > info.nbins:
-                            print(line[2], line[3], info.step, info.duration)
-                            print(
-                                "Warning : the segment is out of the range of the histogram"
-                            )
-                            length = info.nbins - idx_beg
-
-                        self.v[idx_beg : idx_beg + length] += 1
-                        self.v_bw[idx_beg : idx_beg + length] += line[1] / length
-                        self.v_meta[idx_beg : idx_beg + length] += meta / length
-
-            temps_nprocs += f.nprocs
+        for f, table in info.iter_segments():
+            self.add(info, f, table)
+        self.finish(info)
+        return
 
+    def finish(self, info):
         self.v_bw_count = np.zeros(self.size, dtype=np.float64)
-        for i in range(self.size):
-            if self.v[i] != 0:
-                self.v_bw_count[i] = self.v_bw[i] / self.v[i]
+        np.divide(self.v_bw, self.v, out=self.v_bw_count, where=self.v != 0)
+        return
+
+    def add(self, info, f, table):
+        """
+        Bins the segments of a table (a whole file, or a chunk of it in streaming mode)
+        """
+        meta = f.get_meta_time(table)
+        mask = table.op_mask(self.op)
+        if not mask.any():
+            return
+
+        seg, bins, v_bw, v_meta = bin_contributions(
+            table.start[mask],
+            table.end[mask],
+            table.length[mask],
+            meta[table.record[mask]],
+            info.step * self.factor,
+            self.size,
+            span=True,
+            clip=info.windowed,
+        )
+        self.v += np.bincount(bins, minlength=self.size).astype(np.uint64)
+        self.v_bw += np.bincount(bins, weights=v_bw, minlength=self.size)
+        self.v_meta += np.bincount(bins, weights=v_meta, minlength=self.size)
+        return
 
+    def merge(self, info, other):
+        """
+        Sums the vectors of other (the same plot filled with another shard of the segments) with self,
+        other can have less bins (the data of a previous incremental run, see DarshanInfo.fill_incremental)
+        """
+        self.v[: other.size] += other.v
+        self.v_bw[: other.size] += other.v_bw
+        self.v_meta[: other.size] += other.v_meta
         return
 
+    def data_name(self):
+        if self.factor != 1:
+            return "{}_plot_x{}".format(self.op, self.factor)
+        return "{}_plot".format(self.op)
+
+    def save_data(self, info, prefix=None):
+        save_data(
+            info,
+            self,
+            self.data_name(),
+            {
+                "factor": np.array(self.factor),
+                "v": self.v,
+                "v_bw": self.v_bw,
+                "v_meta": self.v_meta,
+            },
+            prefix,
+        )
+        return
+
+    @classmethod
+    def load_data(cls, info, data):
+        m = cls(info, load=False)
+        m.op = data["op"]
+        m.factor = int(data.get("factor", 1))
+        m.size = len(data["v"])
+        m.v, m.v_bw, m.v_meta = data["v"], data["v_bw"], data["v_meta"]
+        m.finish(info)
+        return m
+
     def to_plot(self, info):
+        import matplotlib.pyplot as plt
+
         fig, ax = plt.subplots(2, 2, figsize=(16, 8))
-        fig.suptitle("Plot of the {} I/O".format(info.op))
+        fig.suptitle("Plot of the {} I/O".format(self.op))
 
-        ax[0, 0].plot(self.v, label="Number of {}s".format(info.op))
-        ax[0, 0].set_title("Number of {}s".format(info.op))
+        ax[0, 0].plot(self.v, label="Number of {}s".format(self.op))
+        ax[0, 0].set_title("Number of {}s".format(self.op))
         # ax[0, 0].set_xlabel('Time (s)')
-        ax[0, 0].set_ylabel("Number of {}s".format(info.op))
+        ax[0, 0].set_ylabel("Number of {}s".format(self.op))
 
-        ax[0, 1].plot(self.v_bw, label="Bandwidth of {}s".format(info.op))
-        ax[0, 1].set_title("Bandwidth of {}s".format(info.op))
+        ax[0, 1].plot(self.v_bw, label="Bandwidth of {}s".format(self.op))
+        ax[0, 1].set_title("Bandwidth of {}s".format(self.op))
         # ax[0, 1].set_xlabel('Time (s)')
-        ax[0, 1].set_ylabel("Bandwidth of {}s".format(info.op))
+        ax[0, 1].set_ylabel("Bandwidth of {}s".format(self.op))
 
-        ax[1, 0].plot(self.v_bw_count, label="Bandwidth per {}s".format(info.op))
-        ax[1, 0].set_title("Bandwidth per {}s".format(info.op))
+        ax[1, 0].plot(self.v_bw_count, label="Bandwidth per {}s".format(self.op))
+        ax[1, 0].set_title("Bandwidth per {}s".format(self.op))
         ax[1, 0].set_xlabel("Time (s)")
-        ax[1, 0].set_ylabel("Bandwidth per {}s".format(info.op))
+        ax[1, 0].set_ylabel("Bandwidth per {}s".format(self.op))
 
-        ax[1, 1].plot(self.v_meta, label="Metadata time per {}s".format(info.op))
-        ax[1, 1].set_title("Metadata time per {}s".format(info.op))
+        ax[1, 1].plot(self.v_meta, label="Metadata time per {}s".format(self.op))
+        ax[1, 1].set_title("Metadata time per {}s".format(self.op))
         ax[1, 1].set_xlabel("Time (s)")
-        ax[1, 1].set_ylabel("Metadata time per {}s".format(info.op))
+        ax[1, 1].set_ylabel("Metadata time per {}s".format(self.op))
 
         fig.tight_layout()
-        fig.savefig("{}_{}_plot.png".format(info.output, info.op))
+        fig.savefig("{}_{}_plot.png".format(info.output, self.op))
+        plt.close(fig)
         return
@@ -0,0 +1,73 @@
+import numpy as np
+
+"""
+This module is the binning kernel shared by the features (RW_SparseMatrix, FileNbRankPerSec, AggregateInfo).
+It spreads whole columns of DXT segments over the time bins they cover, without any per-segment python loop.
+"""
+
+
+def bin_segments(start, end, step, nbins, span=False, clip=False):
+    """
+    Returns (seg, bins, length) :
+        - seg : for each (segment, bin) pair, the index of the segment in the input columns
+        - bins : for each (segment, bin) pair, the index of the bin
+        - length : the number of bins covered by each segment
+
+    By default the number of bins is computed from the duration of the segment (dxt_posix, nb_rank_file),
+    with span=True it is computed from the bins of the start and the end of the segment (aggregate_info).
+    The segments that end after the last bin are cut, with a warning unless clip is True (the segments cut by the end of a time window).
+    """
+    start = np.asarray(start, dtype=np.float64)
+    end = np.asarray(end, dtype=np.float64)
+
+    idx_beg = np.floor_divide(start, step).astype(np.int64)
+    if span:
+        length = np.floor_divide(end, step).astype(np.int64) - idx_beg + 1
+    else:
+        length = np.floor_divide(end - start, step).astype(np.int64) + 1
+
+    # the segments that start before the time window (see SegmentTable.window) only keep their bins in the window
+    before = idx_beg < 0
+    if before.any():
+        length[before] += idx_beg[before]
+        idx_beg[before] = 0
+
+    out = idx_beg + length > nbins
+    if out.any() and not clip:
+        print(
+            "Warning : {} segments are out of the range of the histogram".format(
+                np.count_nonzero(out)
+            )
+        )
+    length[out] = nbins - idx_beg[out]
+    np.maximum(length, 0, out=length)
+
+    seg = np.repeat(np.arange(len(length)), length)
+    first = np.cumsum(length) - length
+    bins = idx_beg[seg] + np.arange(len(seg)) - first[seg]
+    return seg, bins, length
+
+
+def bin_contributions(start, end, nbytes, meta, step, nbins, span=False, clip=False):
+    """
+    Returns (seg, bins, bw, meta) where bw and meta are the contributions of each segment to each bin
+    (i.e. the bytes and the metadata time of the segment divided by the number of bins it covers).
+    The count contribution is always 1.
+    """
+    seg, bins, length = bin_segments(start, end, step, nbins, span, clip)
+    length = length[seg]
+    v_bw = np.asarray(nbytes, dtype=np.float64)[seg] / length
+    v_meta = np.asarray(meta, dtype=np.float64)[seg] / length
+    return seg, bins, v_bw, v_meta
+
+
+def sum_entries(x, y, ncols, *values):
+    """
+    Sums the values of the entries that have the same (x, y), it is used to keep the accumulated matrices
+    as small as their non-zero entries. Returns (x, y, *values)
+    """
+    key, inverse = np.unique(
+        np.asarray(x, dtype=np.int64) * ncols + y, return_inverse=True
+    )
+    summed = tuple(np.bincount(inverse, weights=v, minlength=len(key)) for v in values)
+    return (key // ncols, key % ncols) + summed
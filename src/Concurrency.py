@@ -0,0 +1,245 @@
+import numpy as np
+
+from MatrixData import save_data
+
+"""
+This class is used to create plots of the number of ranks and files that do I/O at the same time, and a heatmap of the number of ranks
+of each host that do I/O at the same time. The concurrency is exact (it is not the number of segments in a bin) :
+    - the segments of each rank (or file, or rank of a host) are merged in busy intervals (see busy_intervals)
+    - the start (+1) and end (-1) events of the busy intervals are sorted, their cumulative sum is the number of busy ranks
+      between two events, then the maximum and the time average of each bin are taken from this step function (see sweep)
+
+The options are :
+    - op : the type of operation (read, write, or both)
+    - nbins : the number of bins of the plots (i.e the discretisation of the time axis)
+    - norm : the normalization of the heatmaps of the hosts (see matplotlib.pyplot.imshow documentation)
+    - output : the name of the output repository
+"""
+
+# the levels of the concurrency : the busy ranks, the busy files and the busy ranks of each host
+LEVELS = ("rank", "file", "host")
+
+
+class Concurrency:
+    def __init__(self, info, load=True):
+        """
+        If load is False, the plot is empty, the tables are added with add() and the concurrency is computed with finish()
+        (see DarshanInfo.fill). The rows of the heatmaps are the hostnames.
+        """
+        self.op = info.op
+        self.group = "hostname"
+        self.size = info.nbins
+        # the busy intervals (group, key, start, end) of each level, they are merged again and swept by finish
+        self.intervals = {level: list() for level in LEVELS}
+        self.max = dict()
+        self.mean = dict()
+        if load:
+            self.get_data(info)
+
+    def get_data(self, info):
+        for f, table in info.iter_segments():
+            self.add(info, f, table)
+        self.finish(info)
+        return
+
+    def add(self, info, f, table):
+        """
+        Merges the segments of a table (a whole file, or a chunk of it in streaming mode) in busy intervals,
+        the intervals of a rank (or a file) that is in several tables are merged by finish
+        """
+        mask = table.op_mask(self.op)
+        if not mask.any():
+            return
+
+        start, end = table.start[mask], table.end[mask]
+        rank = f.rank_offset + table.rank[mask].astype(np.int64)
+        host = table.host_codes[table.host[mask]]
+        file = table.file_codes[table.file[mask]]
+        single = np.zeros(len(rank), dtype=np.int64)
+        keys = {"rank": (single, rank), "file": (single, file), "host": (host, rank)}
+        for level, (group, key) in keys.items():
+            self.intervals[level].append(busy_intervals(group, key, start, end))
+        return
+
+    def merge(self, info, other):
+        """
+        Adds the busy intervals of other (the same plot filled with another shard of the segments) to self,
+        the numbers of busy ranks can't be summed bin by bin, so the concurrency is computed again by finish
+        """
+        for level in LEVELS:
+            self.intervals[level] += other.intervals[level]
+        return
+
+    def finish(self, info):
+        for level in LEVELS:
+            if len(self.intervals[level]) == 0:
+                group, key, start, end = empty_intervals()
+            else:
+                group, key, start, end = busy_intervals(
+                    *(np.concatenate(column) for column in zip(*self.intervals[level]))
+                )
+            self.intervals[level] = [(group, key, start, end)]
+            ngroups = len(info.hostnames) if level == "host" else 1
+            self.max[level], self.mean[level] = sweep(
+                group, start, end, ngroups, info.step, self.size
+            )
+        return
+
+    def coarsen(self, info, factor):
+        """
+        Returns the plot whose bins are factor neighbouring bins of self (the maximum of their maxima and the mean of their averages),
+        info has the coarser time axis
+        """
+        m = Concurrency(info, load=False)
+        m.op = self.op
+        m.intervals = self.intervals
+        first = np.arange(0, self.size, factor)
+        width = np.diff(np.append(first, self.size))
+        for level in LEVELS:
+            m.max[level] = np.maximum.reduceat(self.max[level], first, axis=1)
+            m.mean[level] = np.add.reduceat(self.mean[level], first, axis=1) / width
+        return m
+
+    def data_name(self):
+        return "{}_concurrency".format(self.op)
+
+    def save_data(self, info, prefix=None):
+        """
+        Saves the concurrency of each level and the busy intervals, so that the partial data of the incremental mode are merged exactly
+        """
+        arrays = dict()
+        for level in LEVELS:
+            (intervals,) = self.intervals[level]
+            arrays[level + "_max"] = self.max[level]
+            arrays[level + "_mean"] = self.mean[level]
+            for k, column in zip(("group", "key", "start", "end"), intervals):
+                arrays["{}_{}".format(level, k)] = column
+        save_data(info, self, self.data_name(), arrays, prefix)
+        return
+
+    @classmethod
+    def load_data(cls, info, data):
+        m = cls(info, load=False)
+        m.op = data["op"]
+        for level in LEVELS:
+            m.max[level] = data[level + "_max"]
+            m.mean[level] = data[level + "_mean"]
+            m.intervals[level] = [
+                tuple(
+                    data["{}_{}".format(level, k)]
+                    for k in ("group", "key", "start", "end")
+                )
+            ]
+        m.size = m.max["rank"].shape[1]
+        return m
+
+    def to_plot(self, info):
+        import matplotlib.pyplot as plt
+
+        fig, ax = plt.subplots(2, 2, figsize=(16, 8))
+        fig.suptitle("Concurrency of the {} I/O".format(self.op))
+        time = info.tstart + info.step * np.arange(self.size)
+
+        for a, level, name in (
+            (ax[0, 0], "rank", "ranks"),
+            (ax[0, 1], "file", "files"),
+        ):
+            a.step(time, self.max[level][0], where="post", label="maximum")
+            a.step(time, self.mean[level][0], where="post", label="average")
+            a.set_title("Number of {} doing {}s at the same time".format(name, self.op))
+            a.set_ylabel("Number of {}".format(name))
+            a.legend()
+
+        extent = [info.tstart, info.tend, 0, self.max["host"].shape[0]]
+        for a, array, name in (
+            (ax[1, 0], self.max["host"], "Maximum"),
+            (ax[1, 1], self.mean["host"], "Average"),
+        ):
+            a.set_title("{} number of ranks doing {}s per host".format(name, self.op))
+            a.set_xlabel("Time (s)")
+            if array.shape[0] == 0:
+                continue
+            a.imshow(
+                array,
+                aspect="auto",
+                cmap=info.cmap,
+                interpolation="nearest",
+                origin="lower",
+                extent=extent,
+                norm=info.norm,
+            )
+            a.set_ylabel("hostname")
+            fig.colorbar(a.images[0], ax=a)
+
+        fig.tight_layout()
+        fig.savefig("{}_{}_concurrency.png".format(info.output, self.op))
+        plt.close(fig)
+        return
+
+
+def empty_intervals():
+    return (
+        np.zeros(0, dtype=np.int64),
+        np.zeros(0, dtype=np.int64),
+        np.zeros(0),
+        np.zeros(0),
+    )
+
+
+def busy_intervals(group, key, start, end):
+    """
+    Returns (group, key, start, end) the union of the intervals of each (group, key) : the intervals that overlap or touch are merged.
+    The start (+1) and end (-1) events are sorted by group, key and time, and their cumulative sum is the number of intervals
+    of the key that are open (the events of a key sum to 0, so one cumulative sum over all the keys is enough)
+    """
+    n = len(start)
+    if n == 0:
+        return empty_intervals()
+    group = np.concatenate((group, group))
+    key = np.concatenate((key, key))
+    times = np.concatenate((start, end)).astype(np.float64)
+    delta = np.concatenate((np.ones(n, dtype=np.int64), -np.ones(n, dtype=np.int64)))
+    # (at the same time, the starts are before the ends, so that the intervals that touch are merged)
+    order = np.lexsort((-delta, times, key, group))
+    group, key, times, delta = group[order], key[order], times[order], delta[order]
+    opened = np.cumsum(delta)
+
+    first = (opened == 1) & (delta == 1)
+    last = opened == 0
+    return group[first], key[first], times[first], times[last]
+
+
+def sweep(group, start, end, ngroups, step, nbins):
+    """
+    Returns (max, mean), arrays of shape (ngroups, nbins) : the maximum and the time average in each bin of the number of intervals
+    of each group that are open. The events are sorted once (O(n log n)) and each group has its own time axis of nbins + 1 bins
+    on the same axis, so that all the groups are swept at once. The intervals of zero duration are not counted.
+    """
+    width = nbins + 1
+    maximum = np.zeros(ngroups * width, dtype=np.int64)
+    if len(start) == 0:
+        return maximum.reshape(ngroups, width)[:, :nbins], np.zeros((ngroups, nbins))
+
+    # the times are in bins, the intervals out of the time axis are clipped
+    offset = np.concatenate((group, group)) * width
+    times = offset + np.clip(np.concatenate((start, end)) / step, 0, nbins)
+    delta = np.concatenate(
+        (np.ones(len(start), dtype=np.int64), -np.ones(len(end), dtype=np.int64))
+    )
+    # (at the same time, the ends are before the starts)
+    order = np.lexsort((delta, times))
+    times, count = times[order], np.cumsum(delta[order])
+    # the number of open intervals on [times[i], times[i + 1]) is the count after the last event at times[i]
+    last = np.append(times[1:] != times[:-1], True)
+    times, count = times[last], count[last]
+
+    # the mean of a bin is the integral of the count over the bin (the integral is linear between two events)
+    edges = (np.arange(ngroups)[:, None] * width + np.arange(width)).ravel()
+    integral = np.concatenate(([0.0], np.cumsum(count[:-1] * np.diff(times))))
+    mean = np.diff(np.interp(edges, times, integral).reshape(ngroups, width), axis=1)
+
+    # the maximum of a bin is the count at its start or the count after an event in the bin
+    before = np.searchsorted(times, edges, side="right") - 1
+    maximum[:] = np.where(before >= 0, count[np.maximum(before, 0)], 0)
+    np.maximum.at(maximum, np.floor(times).astype(np.int64), count)
+    return maximum.reshape(ngroups, width)[:, :nbins], mean
@@ -0,0 +1,167 @@
+import numpy as np
+
+from DarshanInfo import DarshanInfo
+from MatrixData import row_labels
+from Options import Options
+
+"""
+This module is the python API of darshan-info : the features return their binned data (numpy arrays and scipy sparse matrices)
+with the labels of their rows and their time axis, without figure and without writing any file.
+
+    import DarshanAPI
+    logs = DarshanAPI.load("logs/", DarshanAPI.Options(jobs=4))
+    binned = DarshanAPI.bin_io(logs, DarshanAPI.Options(nbins=200, ops=["write"], groups=["rank"]))
+    binned["write", "rank"].data["bw"]  # the bandwidth of each rank in each bin (scipy.sparse.csr_matrix)
+
+The features are bin_io, ranks_per_file, aggregate and concurrency.
+The darshan files are read once by load, then each feature takes the options of its time axis and of its matrices (see Options),
+a path can be given instead of the result of load (the darshan files are then read with the options of the feature).
+"""
+
+
+class Binned:
+    """
+    The binned data of a feature for an op (and a group of rows) :
+        - data : the arrays (or sparse matrices, one row per label) of the feature
+        - labels : the label of each row (the rank, the file id or the hostname), None for the vectors of aggregate
+        - other : with top_other (see Options), the last row is the sum of the rows that are not kept and it has no label
+        - times : the start time of each bin in seconds since the start of the darshan files
+    """
+
+    def __init__(
+        self, feature, op, group, data, labels, tstart, step, nbins, other=False
+    ):
+        self.feature = feature
+        self.op = op
+        self.group = group
+        self.data = data
+        self.labels = labels
+        self.other = other
+        self.step = step
+        self.nbins = nbins
+        ncols = max(np.shape(array)[-1] for array in data.values())
+        self.times = tstart + step * np.arange(ncols)
+
+    def __repr__(self):
+        return "Binned({}, op={}, group={}, {} bins of {:.3f} sec, {})".format(
+            self.feature,
+            self.op,
+            self.group,
+            self.nbins,
+            self.step,
+            ", ".join(
+                "{} {}".format(k, "x".join(str(n) for n in np.shape(v)))
+                for k, v in self.data.items()
+            ),
+        )
+
+
+def load(path, options=None, files=None):
+    """
+    Returns the darshan files of path (a darshan file or a repository) read with options, for several features.
+    The DarshanFile files can be given instead of path (e.g. benchmarks/synthetic.py)
+    """
+    if options is None:
+        options = Options()
+    if files is not None:
+        path = files[0].path
+    return DarshanInfo(["darshan-info", path], files=files, options=options)
+
+
+def compute(logs, options, method):
+    if options is None:
+        options = Options()
+    if not isinstance(logs, DarshanInfo):
+        logs = load(logs, options)
+    logs.set_feature_options(options)
+    return logs, getattr(logs, method)()
+
+
+def bin_io(logs, options=None):
+    """
+    Returns {(op, group): Binned} the I/O of each group of rows (rank, file or hostname) in each time bin,
+    the data are the sparse matrices count (the number of I/O), bw (the bytes), bw_count and meta (the metadata time)
+    """
+    logs, matrices = compute(logs, options, "bin_io")
+    binned = dict()
+    for m in matrices:
+        data = {
+            "count": m.mat.mat.tocsr(),
+            "bw": m.mat_bw.mat.tocsr(),
+            "bw_count": m.mat_bw_count.mat.tocsr(),
+            "meta": m.mat_meta.mat.tocsr(),
+        }
+        binned[m.op, m.group] = Binned(
+            "bin_io",
+            m.op,
+            m.group,
+            data,
+            row_labels(logs, m.group, m.rows),
+            logs.tstart,
+            logs.step,
+            logs.nbins,
+            m.other,
+        )
+    return binned
+
+
+def ranks_per_file(logs, options=None):
+    """
+    Returns {op: Binned} the number of ranks that access each file in each time bin, the data is the sparse matrix ranks
+    """
+    logs, matrices = compute(logs, options, "ranks_per_file")
+    binned = dict()
+    for m in matrices:
+        binned[m.op] = Binned(
+            "ranks_per_file",
+            m.op,
+            "file",
+            {"ranks": m.mat.tocsr()},
+            row_labels(logs, "file", m.rows),
+            logs.tstart,
+            logs.step,
+            logs.nbins,
+            m.other,
+        )
+    return binned
+
+
+def aggregate(logs, options=None):
+    """
+    Returns {op: Binned} the I/O of all the ranks in each time bin, the data are the vectors count (the number of I/O),
+    bw (the bytes), bw_count and meta (the metadata time)
+    """
+    logs, matrices = compute(logs, options, "aggregate")
+    binned = dict()
+    for m in matrices:
+        data = {"count": m.v, "bw": m.v_bw, "bw_count": m.v_bw_count, "meta": m.v_meta}
+        binned[m.op] = Binned(
+            "aggregate", m.op, None, data, None, logs.tstart, logs.step, logs.nbins
+        )
+    return binned
+
+
+def concurrency(logs, options=None):
+    """
+    Returns {op: Binned} the number of ranks and files that do I/O at the same time, the data are the vectors (one row)
+    rank_max, rank_mean, file_max and file_mean (the maximum and the time average in each bin) and the matrices host_max and host_mean
+    (the busy ranks of each host, one row per label)
+    """
+    logs, matrices = compute(logs, options, "concurrency")
+    binned = dict()
+    for m in matrices:
+        data = dict()
+        for level in ("rank", "file", "host"):
+            data[level + "_max"] = m.max[level]
+            data[level + "_mean"] = m.mean[level]
+        binned[m.op] = Binned(
+            "concurrency",
+            m.op,
+            "hostname",
+            data,
+            row_labels(logs, "hostname"),
+            logs.tstart,
+            logs.step,
+            logs.nbins,
+        )
+    return binned
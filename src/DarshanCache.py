@@ -0,0 +1,126 @@
+import datetime
+import hashlib
+import os
+import numpy as np
+
+from SegmentTable import SegmentTable
+
+"""
+This class is an on-disk cache of the converted records of the darshan files (used by DarshanFile).
+Each darshan file has one npz entry in the cache directory with its header, its POSIX counters/fcounters and its DXT_POSIX segment table.
+An entry is keyed by the path, the size, the modification time and a hash of the content of the darshan file.
+When the cache is bigger than max_size (in bytes), the least recently used entries are removed.
+"""
+
+
+class DarshanCache:
+    def __init__(self, directory, max_size=1 << 30):
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, path):
+        stat = os.stat(path)
+        content = hashlib.blake2b()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                content.update(chunk)
+        key = hashlib.blake2b(
+            "{}\0{}\0{}\0{}".format(
+                os.path.abspath(path),
+                stat.st_size,
+                stat.st_mtime_ns,
+                content.hexdigest(),
+            ).encode(),
+            digest_size=20,
+        )
+        return key.hexdigest()
+
+    def entry(self, f):
+        if getattr(f, "cache_key", None) is None:
+            f.cache_key = self.key(f.path)
+        return os.path.join(self.directory, f.cache_key + ".npz")
+
+    def load(self, f):
+        """
+        Fills the header, the POSIX records and the DXT_POSIX segments of the DarshanFile f from the cache,
+        returns False if the darshan file is not in the cache.
+        """
+        entry = self.entry(f)
+        if not os.path.exists(entry):
+            return False
+
+        with np.load(entry) as data:
+            arrays = {k: data[k] for k in data.files}
+        # the entry is touched so that the eviction removes the least recently used ones
+        os.utime(entry)
+
+        f.nprocs = int(arrays["nprocs"])
+        f.start_time = datetime.datetime.fromtimestamp(float(arrays["start_time"]))
+        f.end_time = datetime.datetime.fromtimestamp(float(arrays["end_time"]))
+        f.modules = arrays["modules"].tolist()
+        if "segments_start" in arrays:
+            f.segments = SegmentTable.from_arrays(arrays)
+        if "posix_counters" in arrays:
+            import pandas as pd
+
+            f.posix = {
+                name: pd.DataFrame(
+                    {
+                        col: arrays["{}:{}".format(name, col)]
+                        for col in arrays["posix_" + name].tolist()
+                    }
+                )
+                for name in ("counters", "fcounters")
+            }
+        return True
+
+    def store(self, f):
+        """
+        Writes the header and what has been converted of the DarshanFile f in the cache
+        """
+        arrays = {
+            "nprocs": np.array(f.nprocs),
+            "start_time": np.array(f.start_time.timestamp()),
+            "end_time": np.array(f.end_time.timestamp()),
+            "modules": np.array(f.modules, dtype=str),
+        }
+        if f.segments is not None:
+            arrays.update(f.segments.to_arrays())
+        if f.posix is not None:
+            for name in ("counters", "fcounters"):
+                df = f.posix[name]
+                arrays["posix_" + name] = np.array(df.columns, dtype=str)
+                for col in df.columns:
+                    arrays["{}:{}".format(name, col)] = df[col].values
+
+        entry = self.entry(f)
+        tmp = "{}.{}.tmp".format(entry, os.getpid())
+        with open(tmp, "wb") as out:
+            np.savez(out, **arrays)
+        os.replace(tmp, entry)
+        self.evict()
+        return
+
+    def evict(self):
+        entries = list()
+        for name in os.listdir(self.directory):
+            if name.endswith(".npz"):
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    # removed by another process using the same cache
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+        entries.sort()
+
+        size = sum(e[1] for e in entries)
+        for _, entry_size, name in entries:
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+        return
@@ -1,5 +1,9 @@
-import darshan
+import os
 import time
+import numpy as np
+
+from Profiler import profiler
+from SegmentTable import SegmentTable
 
 """
 This class is used to read a Darshan file and extract the information, it is used by DarshanInfo.
@@ -7,57 +11,214 @@ This class is used to read a Darshan file and extract the information, it is use
 
 
 class DarshanFile:
-    def __init__(self, f): 
+    def __init__(self, f, cache=None, report=None, header=None, verbose=True):
+        """
+        The report of the darshan file f is opened when it is needed, unless a report is given (e.g. benchmarks/synthetic.py).
+        The header (nprocs, start_time, end_time and modules) can be given (see LogIndex.header), then the report is only opened for the records.
+        The progress is printed if verbose (see Options)
+        """
+        self.path = f
         self.file = f.split("/")[-1]
-        self.report = darshan.DarshanReport(f, read_all=False)
-        self.nprocs = self.report.metadata["job"]["nprocs"]
-        self.dxt_posix = None
+        self.cache = cache
+        self.report = report
+        self.segments = None
         self.posix = None
+        self.posix_merged = None
+        self.meta_index = None
+        self.verbose = verbose
+        # the records have been converted since the last store in the cache
+        self.converted = False
+        if cache is not None and cache.load(self):
+            self.log("The file {} has been loaded from the cache".format(self.file))
+            return
+        if header is not None:
+            self.__dict__.update(header)
+            return
 
-    def get_dxt_posix(self):
-        if "DXT_POSIX" not in self.report.modules:
-            print("The file {} does not have DXT_POSIX records".format(self.file))
-            return 0
+        report = self.get_report()
+        self.nprocs = report.metadata["job"]["nprocs"]
+        self.start_time = report.start_time
+        self.end_time = report.end_time
+        self.modules = list(report.modules)
 
-        if "DXT_POSIX" in self.report.records:
-            print("The file {} has already loaded DXT_POSIX records".format(self.file))
+    def log(self, *args, **kwargs):
+        if self.verbose:
+            print(*args, **kwargs)
+        return
 
-        else:
-            print("Reading DXT_POSIX in the file {}".format(self.file), end="\t")
-            start_t = time.time()
-            self.report.read_all_dxt_records()
-            print("in %.3f sec" % (time.time() - start_t), end="\t")
+    def span(self, name, message=None, **args):
+        # the stage is timed even if its message is not printed (see Profiler.span)
+        return profiler.span(name, message if self.verbose else None, **args)
+
+    def store(self):
+        """
+        Writes the records converted by get_dxt_posix and get_posix in the cache, it is called once they are both converted
+        so that the entry is written once
+        """
+        if self.cache is not None and self.converted:
+            self.cache.store(self)
+        self.converted = False
+        return
+
+    def get_report(self):
+        # the report is only opened when the records are not in the cache
+        if self.report is None:
+            import darshan
+
+            self.report = darshan.DarshanReport(self.path, read_all=False)
+        return self.report
 
-        if self.dxt_posix:
-            print(
+    def __getstate__(self):
+        # the report holds the handle of the log, it can't be sent to another process
+        state = self.__dict__.copy()
+        state["report"] = None
+        return state
+
+    def get_dxt_posix(self):
+        if "DXT_POSIX" not in self.modules:
+            self.log("The file {} does not have DXT_POSIX records".format(self.file))
+            return 0
+
+        if self.segments is not None:
+            self.log(
                 "The file {} has already converted DXT_POSIX records".format(self.file)
             )
-            return len(self.dxt_posix)
+            return self.segments.nb_records()
 
-        start_t = time.time()
-        self.dxt_posix = self.report.records["DXT_POSIX"].to_df()
-        print("Convert DXT_POSIX to dataframe in %.3f sec" % (time.time() - start_t))
-        return len(self.dxt_posix)
+        report = self.get_report()
+        if "DXT_POSIX" in report.records:
+            self.log(
+                "The file {} has already loaded DXT_POSIX records".format(self.file)
+            )
 
-    def get_posix(self):
-        if "POSIX" not in self.report.modules:
-            print("The file {} does not have POSIX records".format(self.file))
+        else:
+            with self.span(
+                "read",
+                "Read DXT_POSIX in the file {}".format(self.file),
+                end="\t",
+                file=self.file,
+            ):
+                report.read_all_dxt_records()
+
+        with self.span("convert", "Convert DXT_POSIX to segment table", file=self.file):
+            self.segments = SegmentTable.from_dxt_records(report.records["DXT_POSIX"])
+            profiler.count("segments", len(self.segments))
+        self.converted = True
+        return self.segments.nb_records()
+
+    def iter_dxt_posix(self, nb_records):
+        """
+        Reads the DXT_POSIX records directly from the log, nb_records at a time, and yields them as segment tables.
+        The records are not kept, so the memory does not depend on the size of the trace (streaming mode).
+        As with read_all_dxt_records of pydarshan, the records that have no name record are skipped.
+        """
+        if "DXT_POSIX" not in self.modules:
+            self.log("The file {} does not have DXT_POSIX records".format(self.file))
             return
 
-        if "POSIX" in self.report.records:
-            print("The file {} has already loaded POSIX records".format(self.file))
+        import darshan.backend.cffi_backend as backend
 
-        else:
-            print("Reading POSIX in the file {}".format(self.file), end="\t")
-            start_t = time.time()
-            self.report.read_all_generic_records()
-            print("in %.3f sec" % (time.time() - start_t), end="\t")
+        self.log("Streaming DXT_POSIX in the file {}".format(self.file))
+        log = backend.log_open(self.path)
+        try:
+            names = backend.log_get_name_records(log)
+            records = list()
+            rec = backend.log_get_dxt_record(log, "DXT_POSIX")
+            while rec is not None:
+                if rec["id"] in names:
+                    records.append(rec)
+                if len(records) == nb_records:
+                    yield SegmentTable.from_dxt_records(records)
+                    records = list()
+                rec = backend.log_get_dxt_record(log, "DXT_POSIX")
+            if len(records) != 0:
+                yield SegmentTable.from_dxt_records(records)
+        finally:
+            backend.log_close(log)
+        return
+
+    def get_posix(self):
+        if "POSIX" not in self.modules:
+            self.log("The file {} does not have POSIX records".format(self.file))
+            return
 
         if self.posix:
-            print("The file {} has already converted POSIX records".format(self.file))
+            self.log(
+                "The file {} has already converted POSIX records".format(self.file)
+            )
             return len(self.posix)
 
-        start_t = time.time()
-        self.posix = self.report.records["POSIX"].to_df()
-        print("Convert POSIX to dataframe in %.3f sec" % (time.time() - start_t))
+        report = self.get_report()
+        if "POSIX" in report.records:
+            self.log("The file {} has already loaded POSIX records".format(self.file))
+
+        else:
+            with self.span(
+                "read",
+                "Read POSIX in the file {}".format(self.file),
+                end="\t",
+                file=self.file,
+            ):
+                report.read_all_generic_records()
+
+        with self.span("convert", "Convert POSIX to dataframe", file=self.file):
+            self.posix = report.records["POSIX"].to_df()
+        self.converted = True
         return len(self.posix)
+
+    def get_posix_merged(self):
+        """
+        Returns the POSIX counters and fcounters merged on (id, rank), the merge is only done once
+        """
+        if self.posix_merged is None:
+            import pandas as pd
+
+            self.posix_merged = pd.merge(
+                self.posix["counters"], self.posix["fcounters"], on=["id", "rank"]
+            )
+        return self.posix_merged
+
+    def get_meta_time(self, table):
+        """
+        Returns the metadata time per operation of each record of a segment table (0 if it is not found).
+        The (id, rank) index of the POSIX records that have I/O is built once, then each table is joined with it.
+        """
+        import pandas as pd
+
+        if self.meta_index is None:
+            posix = self.get_posix_merged()
+            posix = posix[((posix["POSIX_READS"] != 0) | (posix["POSIX_WRITES"] != 0))]
+            self.meta_index = pd.MultiIndex.from_arrays(
+                [posix["id"].values.astype(np.uint64), posix["rank"].values]
+            )
+            self.meta_values = posix["POSIX_F_META_TIME"].values.astype(np.float64)
+
+        found = self.meta_index.get_indexer(
+            pd.MultiIndex.from_arrays([table.record_id, table.record_rank])
+        )
+        meta = np.zeros(len(found))
+        meta[found >= 0] = self.meta_values[found[found >= 0]]
+        meta /= table.read_count + table.write_count
+        for i in np.flatnonzero(meta == 0):
+            self.log(
+                "meta time has not been found for ({}, {})".format(
+                    table.record_id[i], table.record_rank[i]
+                )
+            )
+        return meta
+
+
+def load_darshan_file(path, cache=None, dxt_posix=True, profile=False, verbose=True):
+    """
+    Reads and converts the DXT_POSIX (unless dxt_posix is False) and POSIX records of a darshan file, it is run by the workers of DarshanInfo.
+    The report is not sent back, only the converted records : (DarshanFile, pid of the worker, time spent, spans of the profiler)
+    """
+    profiler.start_worker(profile)
+    start_t = time.time()
+    with profiler.span("load", file=path):
+        f = DarshanFile(path, cache, verbose=verbose)
+        if dxt_posix:
+            f.get_dxt_posix()
+        f.get_posix()
+        f.store()
+    return f, os.getpid(), time.time() - start_t, profiler.drain()
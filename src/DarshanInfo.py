@@ -1,76 +1,696 @@
+import copy
+import datetime
 import time
 import os
-from DarshanFile import DarshanFile
-from RW_SparseMatrix import RW_SparseMatrix
-from FileNbRankPerSec import FileNbRankPerSec
-from MetadataWithout_IO import MetadataWithout_IO
-from AggregateInfo import AggregateInfo
+import sys
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+from DarshanFile import DarshanFile, load_darshan_file
+from MatrixData import check_figure_options, load_data
+from DarshanCache import DarshanCache
+from IncrementalState import IncrementalState
+from LogIndex import LogIndex, parse_time
+from Options import Options
+from Profiler import profiler
 
 """
 This class is used as a container for all the darshan files in a directory (through the class DarshanFile)
-It, then, redirects to the class that was called by the user (e.g. RW_SparseMatrix, FileNbRankPerSec, MetadataWithout_IO)
+It, then, redirects to the class that was called by the user (e.g. RW_SparseMatrix, FileNbRankPerSec, MetadataWithout_IO, Concurrency)
+The classes of the features (and pandas, scipy and matplotlib) are only imported by the features that use them.
+The features are computed by bin_io, ranks_per_file, aggregate and concurrency (they are used by DarshanAPI without the figures),
+the methods of the command line parse the options of argv and render the matrices.
 """
 
 
 class DarshanInfo:
-    def __init__(self, argv):
-        self.path = argv[1]
+    def __init__(self, argv, files=None, options=None):
+        """
+        argv[1] is the darshan file or the repository of darshan files, unless files (a list of DarshanFile) is given.
+        The options of the reading are the ones of argv, unless options (see Options) are given
+        """
         self.argv = argv
-        self.load_darshan_files()
+        argv_options = self.parse_global_options()
+        self.set_options(options if options is not None else argv_options)
+        self.path = self.argv[1]
+        # the output prefix of the features (see parse_feature_options), the partial data of the incremental mode are saved with it
+        self.output = "output/" + self.path.split("/")[-1].split(".")[0]
+        if files is None:
+            self.load_darshan_files()
+        else:
+            self.set_files(files)
+
+    def parse_global_options(self):
+        """
+        Removes from argv the options that are not specific to a feature, sets the ones of the figures
+        and returns the ones of the reading (see Options) :
+            - jobs : the number of processes used to read the darshan files (1 by default, i.e. no process pool)
+            - cache : the directory of the cache of the converted records (no cache by default)
+            - cache-size : the maximum size of the cache in MB (1024 by default)
+            - stream : the number of DXT_POSIX records read at once, the records are binned chunk by chunk
+              instead of being all loaded in memory (no streaming by default)
+            - render-jobs : the number of processes that render the figures while the next matrices are computed
+              (0 by default, i.e. the figures are rendered one after another by the main process)
+            - raster : the heatmaps are written as PNG images (and a JSON of their scale) without figure
+            - save-data : the binned data of the features are saved next to the figures, see replot in main.py
+            - cmap : the colormap of the heatmaps (Reds by default)
+            - incremental : the directory of the state of the incremental mode, only the new or changed darshan files
+              are processed and their data are summed with the data of the files processed by the previous runs
+            - profile : the prefix of the report (<prefix>.json) and of the trace (<prefix>.trace.json) of the stages, see Profiler
+            - index : the SQLite database of the headers of the darshan files (see LogIndex), the headers of the new or changed
+              darshan files are read, then the headers of all the darshan files are taken from the index instead of their reports
+            - job, module, since, until : the selection of the darshan files of a repository by their headers (with the index,
+              or an index in memory) : the job ids (separated by commas), a module that they have (can be repeated),
+              and the time range (seconds since the epoch or ISO date) during which they run
+        """
+        options = Options()
+        # (the norm and the downsampling are the options of each feature, see parse_feature_options)
+        self.norm = "linear"
+        self.downsample = "sum"
+        self.render_jobs = 0
+        self.raster = False
+        self.save_data = False
+        self.cmap = "Reds"
+        self.profile = False
+        argv = list()
+        i = 0
+        while i < len(self.argv):
+            if self.argv[i] == "-jobs":
+                options.jobs = int(self.argv[i + 1])
+                i += 2
+                continue
+            if self.argv[i] == "-render-jobs":
+                self.render_jobs = int(self.argv[i + 1])
+                i += 2
+                continue
+            if self.argv[i] == "-raster":
+                self.raster = True
+                i += 1
+                continue
+            if self.argv[i] == "-save-data":
+                self.save_data = True
+                i += 1
+                continue
+            if self.argv[i] == "-cmap":
+                self.cmap = self.argv[i + 1]
+                i += 2
+                continue
+            if self.argv[i] == "-incremental":
+                options.incremental = self.argv[i + 1]
+                i += 2
+                continue
+            if self.argv[i] == "-cache":
+                options.cache = self.argv[i + 1]
+                i += 2
+                continue
+            if self.argv[i] == "-stream":
+                options.stream = int(self.argv[i + 1])
+                i += 2
+                continue
+            if self.argv[i] == "-profile":
+                self.profile = True
+                profiler.enable(self.argv[i + 1])
+                i += 2
+                continue
+            if self.argv[i] == "-index":
+                options.index = self.argv[i + 1]
+                i += 2
+                continue
+            if self.argv[i] == "-job":
+                options.job_ids += [
+                    int(job_id) for job_id in self.argv[i + 1].split(",")
+                ]
+                i += 2
+                continue
+            if self.argv[i] == "-module":
+                options.modules.append(self.argv[i + 1])
+                i += 2
+                continue
+            if self.argv[i] == "-since":
+                options.since = parse_time(self.argv[i + 1])
+                i += 2
+                continue
+            if self.argv[i] == "-until":
+                options.until = parse_time(self.argv[i + 1])
+                i += 2
+                continue
+            if self.argv[i] == "-cache-size":
+                options.cache_size = int(self.argv[i + 1])
+                i += 2
+                continue
+            argv.append(self.argv[i])
+            i += 1
+        self.argv = argv
+        self.render_pool = None
+        self.renders = list()
+        return options
+
+    def set_options(self, options):
+        """
+        Sets the options of the reading of the darshan files (see Options)
+        """
+        self.options = options
+        self.verbose = options.verbose
+        self.jobs = options.jobs
+        self.stream = options.stream
+        self.cache = None
+        if options.cache is not None:
+            self.cache = DarshanCache(options.cache, options.cache_size << 20)
+        self.incremental = None
+        if options.incremental is not None:
+            self.incremental = IncrementalState(options.incremental)
+            if self.jobs > 1:
+                # (the new darshan files intern their file ids and hostnames in the state one after another)
+                self.log(
+                    "The process pool (-jobs) is not available in incremental mode, the darshan files are read by one process"
+                )
+                self.jobs = 1
+        self.selection = {
+            "job_ids": options.job_ids,
+            "modules": options.modules,
+            "since": options.since,
+            "until": options.until,
+        }
+        self.index = None
+        if options.index is not None:
+            self.index = LogIndex(options.index)
+        elif any(self.selection.values()):
+            self.index = LogIndex()
+        return
+
+    def set_feature_options(self, options, levels=None):
+        """
+        Sets the time axis and the matrices of the next feature (see Options), and the levels of the time axis (see factors).
+        The progress of the feature (and of the reading of its records) is printed with verbose options
+        """
+        self.verbose = options.verbose
+        for f in self.files:
+            f.verbose = options.verbose
+        self.nbins = options.nbins
+        self.levels = levels if levels is not None else [options.nbins]
+        self.set_window(options.tstart, options.tend)
+        self.ops = list(options.ops)
+        self.groups = list(options.groups)
+        self.top = options.top
+        self.top_by = options.top_by
+        self.top_other = options.top_other
+        return
+
+    def set_window(self, tstart, tend):
+        """
+        Sets the time window [tstart, tend) in seconds since the start, tend is clipped to the duration of the darshan files.
+        Exits if the window is empty
+        """
+        self.tstart = tstart
+        self.tend = self.duration if tend is None else min(tend, self.duration)
+        if not 0 <= self.tstart < self.tend:
+            print(
+                "Wrong time window : [{}, {}), it should be in [0, {}) (the duration of the darshan files)".format(
+                    tstart, tend, self.duration
+                )
+            )
+            sys.exit(1)
+        return
 
     def load_darshan_files(self):
-        print("=" * 100 + "\nStart reading darshan files\n")
-        start_t = time.time()
+        self.log("=" * 100 + "\nStart reading darshan files\n")
+        with self.span("load", "Read the Darshan files", end="\n\n"):
+            self.load_paths()
+        return
 
+    def load_paths(self):
         if os.path.isdir(self.path):
-            self.nprocs = 0
-            self.start = None
-            self.end = None
-
-            filenames = os.listdir(self.path)
-            self.files = list()
-            for it, filename in enumerate(filenames):
+            paths = list()
+            for filename in os.listdir(self.path):
                 if filename.split(".")[-1] != "darshan":
-                    print("The file {} is not a darshan file".format(filename))
+                    self.log("The file {} is not a darshan file".format(filename))
                     continue
-
-                f = DarshanFile(self.path + "/" + filename)
-                self.files.append(f)
-                self.nprocs += f.nprocs
-                self.start = (
-                    f.report.start_time
-                    if not self.start or self.start > f.report.start_time
-                    else self.start
-                )
-                self.end = (
-                    f.report.end_time
-                    if not self.end or self.end < f.report.end_time
-                    else self.end
-                )
+                paths.append(self.path + "/" + filename)
 
         elif self.path.split(".")[-1] == "darshan":
-            self.files = [DarshanFile(self.path)]
-            self.nprocs = self.files[0].nprocs
-            self.start = self.files[0].report.start_time
-            self.end = self.files[0].report.end_time
+            paths = [self.path]
 
         else:
             print("Couldn't read the file {}".format(self.path))
             sys.exit(1)
 
+        paths = self.select_logs(paths)
+        if self.incremental is not None:
+            # only the headers, the records of the new or changed files are read by fill_incremental
+            self.files = [self.open_file(path) for path in paths]
+            self.load_incremental()
+            return
+        elif self.jobs > 1:
+            self.files = self.load_parallel(paths)
+        else:
+            self.files = [self.open_file(path) for path in paths]
+        self.set_files(self.files)
+        return
+
+    def select_logs(self, paths):
+        """
+        Returns the selected darshan files : with the index, the new or changed headers are read in the index,
+        then the darshan files are selected by their headers (see LogIndex.select)
+        """
+        if self.index is None:
+            return paths
+        with self.span(
+            "index", "Scan the headers of {} darshan files".format(len(paths))
+        ):
+            nb_read = self.index.scan(paths)
+        self.log(
+            "{} headers read, {} headers from the index".format(
+                nb_read, len(paths) - nb_read
+            )
+        )
+
+        paths = self.index.select(paths, **self.selection)
+        self.log("{} darshan files selected\n".format(len(paths)))
+        if len(paths) == 0:
+            print("No darshan file is selected")
+            sys.exit(1)
+        return paths
+
+    def open_file(self, path):
+        # with the index, the report is not opened for the header
+        header = self.index.header(path) if self.index is not None else None
+        return DarshanFile(path, self.cache, header=header, verbose=self.verbose)
+
+    def set_files(self, files):
+        """
+        Sets the darshan files, their rank offsets and the time range of all the files
+        """
+        self.files = files
+        for f in self.files:
+            f.verbose = self.verbose
+        self.file_index = dict()
+        self.file_ids = list()
+        self.host_index = dict()
+        self.hostnames = list()
+        self.nprocs = 0
+        self.start = None
+        self.end = None
+        for f in self.files:
+            f.rank_offset = self.nprocs
+            self.nprocs += f.nprocs
+            self.start = (
+                f.start_time
+                if not self.start or self.start > f.start_time
+                else self.start
+            )
+            self.end = f.end_time if not self.end or self.end < f.end_time else self.end
+
         self.duration = (self.end - self.start).total_seconds() + 1
-        print("Read the Darshan files in %.3f sec\n" % (time.time() - start_t))
         return
 
-    def dxt_posix_heatmap(self):
-        self.i += 1
-        self.nbins = 50
+    def load_incremental(self):
+        """
+        Sets the indexes of the rows (rank offsets, file ids and hostnames) and the time range
+        from the state of the incremental mode, the files that are not known yet are added to it
+        """
+        removed = self.incremental.remove_missing([f.path for f in self.files])
+        if len(removed) != 0:
+            self.log(
+                "Incremental mode : {} darshan files are not in this run anymore, all the files are processed again".format(
+                    len(removed)
+                )
+            )
+        manifest = self.incremental.manifest
+        for f in self.files:
+            self.incremental.add_log(f)
+        self.file_ids = list(manifest["file_ids"])
+        self.file_index = {k: i for i, k in enumerate(self.file_ids)}
+        self.hostnames = list(manifest["hostnames"])
+        self.host_index = {k: i for i, k in enumerate(self.hostnames)}
+        self.nprocs = manifest["nprocs"]
+        self.start = datetime.datetime.fromtimestamp(manifest["start"])
+        self.end = datetime.datetime.fromtimestamp(manifest["end"])
+        self.duration = (self.end - self.start).total_seconds() + 1
+        return
+
+    def load_parallel(self, paths):
+        """
+        Reads and converts the darshan files in a pool of self.jobs processes,
+        the workers send back the converted records (see DarshanFile.load_darshan_file)
+        """
+        files = list()
+        workers = dict()
+        with ProcessPoolExecutor(max_workers=self.jobs) as pool:
+            load = partial(
+                load_darshan_file,
+                cache=self.cache,
+                dxt_posix=self.stream is None,
+                profile=self.profile,
+                verbose=self.verbose,
+            )
+            for f, pid, elapsed, events in pool.map(load, paths):
+                files.append(f)
+                profiler.add_events(events)
+                nb_files, nb_segments, total = workers.get(pid, (0, 0, 0))
+                nb_segments += len(f.segments) if f.segments is not None else 0
+                workers[pid] = (nb_files + 1, nb_segments, total + elapsed)
+
+        for pid, (nb_files, nb_segments, total) in workers.items():
+            self.log(
+                "Worker {} read {} files ({} segments) in {:.3f} sec, {:.0f} segments/sec".format(
+                    pid, nb_files, nb_segments, total, nb_segments / total
+                )
+            )
+        return files
+
+    def read_dxt_posix(self, posix=True):
+        """
+        Reads and converts the DXT_POSIX (and POSIX) records of all the files, then indexes the segments.
+        In streaming mode, the DXT_POSIX records are not read here but chunk by chunk in iter_segments.
+        """
+        self.len_dxt_posix = 0
+        self.len_posix = 0
+        self.read_posix = posix
+        if self.incremental is not None:
+            return
+        with self.span("read", "Read and convert all data", end="\n\n"):
+            for f in self.files:
+                if self.stream is None:
+                    self.len_dxt_posix += f.get_dxt_posix()
+                if posix:
+                    self.len_posix += f.get_posix()
+                f.store()
+            self.index_dxt_posix()
+        return
+
+    def index_dxt_posix(self):
+        """
+        Interns the segment tables of all the files, the tables that have codes are interned again :
+        the files can be read by another DarshanInfo (e.g. the files given to DarshanAPI.load twice) whose codes are not the ones of self
+        """
+        for f in self.files:
+            if f.segments is not None:
+                self.index_segments(f.segments)
+        return
+
+    def index_segments(self, table):
+        """
+        Interns the file ids and hostnames of a segment table : file_ids and hostnames are the labels of the codes,
+        and the table gets file_codes and host_codes, the codes of its own file ids and hostnames.
+        """
+        table.file_codes = np.array(
+            [
+                self.intern(self.file_index, self.file_ids, i)
+                for i in table.file_ids.tolist()
+            ],
+            dtype=np.int64,
+        )
+        table.host_codes = np.array(
+            [self.intern(self.host_index, self.hostnames, h) for h in table.hostnames],
+            dtype=np.int64,
+        )
+        return
+
+    def intern(self, index, labels, key):
+        code = index.get(key)
+        if code is None:
+            code = index[key] = len(labels)
+            labels.append(key)
+        return code
+
+    def iter_segments(self):
+        """
+        Yields (DarshanFile, SegmentTable) for all the files, the whole segment table of each file,
+        or in streaming mode, chunks of self.stream DXT_POSIX records that are read from the file and then freed
+        """
+        for f in self.files:
+            yield from self.iter_file_segments(f)
+        return
+
+    def iter_file_segments(self, f):
+        if f.segments is not None:
+            yield f, self.window(f.segments)
+        elif self.stream is not None:
+            for table in f.iter_dxt_posix(self.stream):
+                self.index_segments(table)
+                yield f, self.window(table)
+        return
+
+    def window(self, table):
+        """
+        Returns the segments of the table that are in the time window of the feature, with times relative to tstart (see SegmentTable.window)
+        """
+        if not self.windowed:
+            return table
+        return table.window(self.tstart, self.tend)
+
+    def set_time_axis(self, feature):
+        """
+        Sets the time window [tstart, tend) (the whole duration by default) and the time step of the bins of the feature,
+        in incremental mode it is the one of the state (see IncrementalState.time_axis) and the window is the whole duration
+        """
+        self.feature = feature
+        self.windowed = self.tstart > 0 or self.tend < self.duration
+        if self.incremental is None:
+            self.step = (self.tend - self.tstart) / self.nbins
+            return
+
+        if self.windowed:
+            self.log("The time window is not available in incremental mode")
+            self.tstart, self.tend, self.windowed = 0.0, self.duration, False
+
+        self.nbins, self.step = self.incremental.time_axis(
+            feature, self.duration, self.nbins
+        )
+        self.log(
+            "Incremental mode : {} bins of {:.3f} sec for {}".format(
+                self.nbins, self.step, feature
+            )
+        )
+        return
+
+    def fill(self, matrices):
+        """
+        Walks the segments once and adds each table to all the matrices (all the groups and ops at once),
+        then builds them. With several jobs, the shards of the segments are binned in a process pool (map)
+        and the partial matrices are summed (reduce).
+        """
+        with self.span(
+            "bin",
+            "Generate {} sparse matrices".format(len(matrices)),
+            feature=self.feature,
+        ):
+            if self.incremental is not None:
+                self.fill_incremental(matrices)
+            elif self.jobs > 1 and self.stream is None:
+                self.fill_parallel(matrices)
+            else:
+                for f, table in self.iter_segments():
+                    profiler.count("segments", len(table))
+                    for m in matrices:
+                        m.add(self, f, table)
+            for m in matrices:
+                if self.top is not None and hasattr(m, "select_rows"):
+                    m.select_rows(self)
+                m.finish(self)
+        return
+
+    def fill_parallel(self, matrices):
+        """
+        Each shard is binned in empty copies of the matrices : the pool pickles a shard only when it is sent to a worker,
+        after the first results have been merged in matrices, so the shards must not be given matrices themselves
+        """
+        empty = copy.deepcopy(matrices)
+        with ProcessPoolExecutor(max_workers=self.jobs) as pool:
+            futures = [
+                pool.submit(fill_shard, self, empty, f, table)
+                for f, table in self.iter_shards()
+            ]
+            for future in as_completed(futures):
+                partial_matrices, events = future.result()
+                profiler.add_events(events)
+                for m, partial_m in zip(matrices, partial_matrices):
+                    m.merge(self, partial_m)
+        return
+
+    def fill_incremental(self, matrices):
+        """
+        Fills, for each new or changed file, empty copies of the matrices and saves them as the partial data of the file
+        in the state of the incremental mode, then sums the partial data of all the processed files in the matrices
+        """
+        data_names = [m.data_name() for m in matrices]
+        for f in self.files:
+            if not self.incremental.is_stale(self.feature, f.path, data_names):
+                continue
+
+            self.log("Incremental mode : processing {}".format(f.file))
+            if self.stream is None:
+                self.len_dxt_posix += f.get_dxt_posix()
+                self.index_dxt_posix()
+            if self.read_posix:
+                self.len_posix += f.get_posix()
+            f.store()
+
+            partials = copy.deepcopy(matrices)
+            for _, table in self.iter_file_segments(f):
+                profiler.count("segments", len(table))
+                for m in partials:
+                    m.add(self, f, table)
+            prefix = self.incremental.prefix(self.feature, f.path)
+            for m in partials:
+                m.finish(self)
+                m.save_data(self, prefix)
+            self.incremental.set_processed(self.feature, f.path)
+
+        for path in self.incremental.off_axis(self.feature):
+            self.log("The data of {} are not on the time axis anymore".format(path))
+        for m in matrices:
+            for path in self.incremental.partials(self.feature, m.data_name()):
+                data = load_data(path)
+                m.merge(self, type(m).load_data(self, data))
+
+        self.incremental.manifest["file_ids"] = self.file_ids
+        self.incremental.manifest["hostnames"] = self.hostnames
+        self.incremental.save()
+        return
+
+    def iter_shards(self):
+        """
+        Yields (DarshanFile, SegmentTable) the shards of the segments for fill_parallel : one per file,
+        and the tables are split by ranges of ranks when there are less files than jobs.
+        The DarshanFile is a copy without its segment table, so that only the shard is sent to the worker.
+        """
+        files = [f for f in self.files if f.segments is not None]
+        nb_split = -(-self.jobs // max(len(files), 1))
+        for f in files:
+            light = copy.copy(f)
+            light.segments = None
+            for table in self.window(f.segments).split_ranks(nb_split):
+                yield light, table
+        return
+
+    def __getstate__(self):
+        # the workers only need the options and the indexes, not the files
+        state = self.__dict__.copy()
+        state["files"] = None
+        state["index"] = None
+        state["matrix"] = None
+        state["render_pool"] = None
+        state["renders"] = list()
+        return state
+
+    def log(self, *args, **kwargs):
+        # the progress is only printed with verbose options (see Options), not the errors
+        if self.verbose:
+            print(*args, **kwargs)
+        return
+
+    def span(self, name, message=None, **args):
+        """
+        Times the code in the with block as the stage name (see Profiler.span), the message is only printed with verbose options
+        """
+        return profiler.span(name, message if self.verbose else None, **args)
+
+    def factors(self):
+        """
+        Returns the factors of the levels of the time axis : the bins of a level are factor bins of the finest level
+        """
+        factors = list()
+        for level in sorted(self.levels, reverse=True):
+            factor = max(self.levels) // level
+            if max(self.levels) % level != 0:
+                self.log(
+                    "{} bins is not a divisor of {} bins, it will have {} bins".format(
+                        level, max(self.levels), -(-max(self.levels) // factor)
+                    )
+                )
+            if factor not in factors:
+                factors.append(factor)
+        return factors
+
+    def render_levels(self, matrices, method):
+        """
+        Renders the matrices for each level of the time axis (a pyramid from the finest level that has been computed) :
+        the matrices with a factor (RW_SparseMatrix, AggregateInfo and FileNbRankPerSec) are binned from the segments for their level,
+        the others are coarsened from the finest level (coarsen). With several levels, the output has the number of bins as suffix.
+        """
+        output, nbins, step = self.output, self.nbins, self.step
+        for factor in self.factors():
+            self.nbins = -(-nbins // factor)
+            self.step = step * factor
+            if len(self.levels) > 1:
+                self.output = "{}_{}bins".format(output, self.nbins)
+            for m in matrices:
+                if getattr(m, "factor", 1) == factor:
+                    level_m = m
+                elif factor != 1 and not hasattr(m, "factor"):
+                    level_m = m.coarsen(self, factor)
+                else:
+                    continue
+                self.log(
+                    "=" * 50
+                    + "\nStart generating {} {} with {} bins".format(
+                        m.op, getattr(m, "group", "plot"), self.nbins
+                    )
+                )
+                self.render(level_m, method)
+        self.output, self.nbins, self.step = output, nbins, step
+        return
+
+    def render(self, m, method):
+        """
+        Calls m.to_heatmap or m.to_plot (method), or m.to_raster with -raster. With render-jobs the figure is rendered by a worker of the render pool
+        and this returns as soon as it is submitted, the figures are waited by close()
+        """
+        if self.save_data:
+            m.save_data(self)
+        if self.raster and hasattr(m, "to_raster"):
+            method = "to_raster"
+
+        if self.render_jobs <= 0:
+            with self.span(
+                "render", "Generate heatmap", method=method, op=m.op, output=self.output
+            ):
+                getattr(m, method)(self)
+            return
+
+        if self.render_pool is None:
+            self.render_pool = ProcessPoolExecutor(
+                max_workers=self.render_jobs, initializer=use_agg_backend
+            )
+        # the options (output, step, norm, ...) are copied because the next feature changes them
+        future = self.render_pool.submit(render_figure, copy.copy(self), m, method)
+        name = "{} {} {}".format(method, m.op, getattr(m, "group", "")).strip()
+        future.add_done_callback(
+            lambda future: self.log(
+                "Generate {} in {:.3f} sec".format(name, future.result()[0])
+            )
+        )
+        self.renders.append(future)
+        return
+
+    def close(self):
+        """
+        Waits for the figures that are rendered by the render pool, then writes the profile (with -profile)
+        """
+        if self.render_pool is not None:
+            with self.span("wait", "Wait for the figures"):
+                for future in self.renders:
+                    profiler.add_events(future.result()[1])
+                self.render_pool.shutdown()
+            self.render_pool = None
+            self.renders = list()
+        profiler.close()
+        return
+
+    def parse_feature_options(self, groups=False, downsample=True, top=False):
+        """
+        Parses the options of a feature in argv from self.i : sets the options of the figures (output, norm, downsample, they are checked here)
+        and returns (the options of the feature, see Options, the levels of the time axis)
+        """
+        options = Options()
+        levels = None
+        ops = list()
+        row_groups = list()
         self.output = "output/" + self.path.split("/")[-1].split(".")[0]
         self.norm = "linear"
-        self.groups = list()
-        self.all_groups = {"rank", "file", "hostname"}
-        self.ops = list()
-        self.all_ops = {"read", "write"}
+        if downsample:
+            self.downsample = "sum"
 
         while self.i < len(self.argv):
             arg = self.argv[self.i]
@@ -84,224 +704,239 @@ class DarshanInfo:
                 self.i += 2
                 continue
 
-            if arg.isdigit():
-                self.nbins = int(arg)
+            if arg == "-tstart":
+                options.tstart = float(self.argv[self.i + 1])
+                self.i += 2
+                continue
+
+            if arg == "-tend":
+                options.tend = float(self.argv[self.i + 1])
+                self.i += 2
+                continue
+
+            if downsample and arg == "-downsample":
+                self.downsample = self.argv[self.i + 1]
+                self.i += 2
+                continue
+
+            if top and arg == "-top":
+                options.top = int(self.argv[self.i + 1])
+                self.i += 2
+                continue
+
+            if top and arg == "-top-other":
+                options.top_other = True
+                self.i += 1
+                continue
+
+            if top and groups and arg == "-top-by":
+                options.top_by = self.argv[self.i + 1]
+                self.i += 2
+                continue
+
+            if all(level.isdigit() for level in arg.split(",")):
+                levels = [int(level) for level in arg.split(",")]
+                options.nbins = max(levels)
                 self.i += 1
                 continue
 
-            if arg in self.all_groups:
-                self.groups += {arg}
+            if groups and arg in options.groups:
+                row_groups += {arg}
                 self.i += 1
                 continue
 
-            if arg in self.all_ops:
-                self.ops += {arg}
+            if arg in options.ops:
+                ops += {arg}
                 self.i += 1
                 continue
 
             break
 
-        if len(self.groups) == 0:
-            self.groups = self.all_groups
+        # (only the heatmaps, the features with a downsampling, are written as rasters)
+        if downsample:
+            check_figure_options(self.norm, self.downsample, self.raster)
+        else:
+            check_figure_options(self.norm)
+        if len(ops) != 0:
+            options.ops = ops
+        if len(row_groups) != 0:
+            options.groups = row_groups
+        return options, levels
 
-        if len(self.ops) == 0:
-            self.ops = self.all_ops
+    def dxt_posix_heatmap(self):
+        self.i += 1
+        options, levels = self.parse_feature_options(groups=True, top=True)
+        self.set_feature_options(options, levels)
 
-        print(
+        self.log(
             "=" * 100
             + "\nStart {} dxt_posix_heatmap sorted by {}\n".format(
                 self.ops, self.groups
             )
         )
 
-        start_t = time.time()
-        self.len_dxt_posix = 0
-        self.len_posix = 0
-        self.hostnames = set()
-        self.file_ids = set()
-        for f in self.files:
-            # print(f.p)
-            self.len_dxt_posix += f.get_dxt_posix()
-            self.len_posix += f.get_posix()
-            for e in f.dxt_posix:
-                self.hostnames.add(e["hostname"])
-                self.file_ids.add(e["id"])
-        self.hostnames = list(self.hostnames)
-        self.file_ids = list(self.file_ids)
-
-        print("Read and convert all data in %.3f sec\n" % (time.time() - start_t))
-
-        self.step = self.duration / self.nbins
-        self.matrix = list()
+        self.matrix = self.bin_io()
+        self.render_levels(self.matrix, "to_heatmap")
+        return
+
+    def bin_io(self):
+        """
+        Returns the RW_SparseMatrix of each group and op (and of each level of the time axis) of the feature (see set_feature_options),
+        they are not rendered
+        """
+        self.read_dxt_posix()
+
+        from RW_SparseMatrix import RW_SparseMatrix
+
+        self.set_time_axis("dxt_posix")
+        matrices = list()
+        shared = dict()
         for group in self.groups:
             for op in self.ops:
                 self.group = group
                 self.op = op
-                print(
-                    "=" * 50
-                    + "\nStart generating {} heatmap sorted by {}".format(op, group)
-                )
-
-                start_t = time.time()
-                self.matrix.append(RW_SparseMatrix(self))
-                print("Generate sparse matrix in %.3f sec" % (time.time() - start_t))
-
-                start_t = time.time()
-                self.matrix[-1].to_heatmap(self)
-                print("Generate heatmap in %.3f sec" % (time.time() - start_t))
-        return
+                for factor in self.factors():
+                    matrices.append(
+                        RW_SparseMatrix(self, load=False, shared=shared, factor=factor)
+                    )
+        self.fill(matrices)
+        return matrices
 
     def nb_rank_file(self):
         self.i += 1
-        self.nbins = 50
-        self.output = "output/" + self.path.split("/")[-1].split(".")[0]
-        self.norm = "linear"
-        self.ops = list()
-        self.all_ops = {"read", "write"}
+        options, levels = self.parse_feature_options(top=True)
+        self.set_feature_options(options, levels)
 
-        while self.i < len(self.argv):
-            arg = self.argv[self.i]
-            if arg == "-output":
-                self.output = self.argv[self.i + 1]
-                self.i += 2
-                continue
+        self.log("=" * 100 + "\nStart {} number of rank per file\n".format(self.ops))
 
-            if arg == "-norm":
-                self.norm = self.argv[self.i + 1]
-                self.i += 2
-                continue
-
-            if arg.isdigit():
-                self.nbins = int(arg)
-                self.i += 1
-                continue
-
-            if arg in self.all_ops:
-                self.ops += {arg}
-                self.i += 1
-                continue
-
-            break
+        self.matrix = self.ranks_per_file()
+        self.render_levels(self.matrix, "to_heatmap")
+        return
 
-        if len(self.ops) == 0:
-            self.ops = self.all_ops
+    def ranks_per_file(self):
+        """
+        Returns the FileNbRankPerSec of each op (and of each level of the time axis) of the feature, they are not rendered
+        """
+        self.read_dxt_posix(posix=False)
 
-        print("=" * 100 + "\nStart {} number of rank per file\n".format(self.ops))
+        from FileNbRankPerSec import FileNbRankPerSec
 
-        start_t = time.time()
-        self.len_dxt_posix = 0
-        self.len_posix = 0
-        self.hostnames = set()
-        self.file_ids = set()
-        for f in self.files:
-            self.len_dxt_posix += f.get_dxt_posix()
-            # self.len_posix += f.get_posix()
-            for e in f.dxt_posix:
-                self.hostnames.add(e["hostname"])
-                self.file_ids.add(e["id"])
-        self.hostnames = list(self.hostnames)
-        self.file_ids = list(self.file_ids)
-
-        print("Read and convert all data in %.3f sec\n" % (time.time() - start_t))
-
-        self.step = self.duration / self.nbins
-        self.matrix = list()
+        self.set_time_axis("nb_rank_file")
+        matrices = list()
+        shared = dict()
         for op in self.ops:
             self.op = op
-            print("=" * 50 + "\nStart generating {} heatmap".format(op))
-
-            start_t = time.time()
-            self.matrix.append(FileNbRankPerSec(self))
-            print("Generate sparse matrix in %.3f sec" % (time.time() - start_t))
-
-            start_t = time.time()
-            self.matrix[-1].to_heatmap(self)
-            print("Generate heatmap in %.3f sec" % (time.time() - start_t))
-        return
+            for factor in self.factors():
+                matrices.append(
+                    FileNbRankPerSec(self, load=False, factor=factor, shared=shared)
+                )
+        self.fill(matrices)
+        return matrices
 
     def metadata_without_IO(self):
         self.i += 1
         self.output = "output/" + self.path.split("/")[-1].split(".")[0]
 
-        print()
-        print("=" * 100 + "\nStart generating metadata without IO\n")
+        self.log()
+        self.log("=" * 100 + "\nStart generating metadata without IO\n")
 
-        start_t = time.time()
-        self.len_posix = 0
-        for f in self.files:
-            self.len_posix += f.get_posix()
-        print("Read and convert all data in %.3f sec\n" % (time.time() - start_t))
+        with self.span("read", "Read and convert all data", end="\n\n"):
+            self.len_posix = 0
+            for f in self.files:
+                self.len_posix += f.get_posix()
+                f.store()
+
+        from MetadataWithout_IO import MetadataWithout_IO
 
-        start_t = time.time()
-        metadata = MetadataWithout_IO(self)
-        metadata.get_info(self)
-        print("Generate metadata in %.3f sec" % (time.time() - start_t))
+        with self.span("metadata", "Generate metadata"):
+            metadata = MetadataWithout_IO(self)
+            metadata.get_info(self)
 
     def aggregate_info(self):
         self.i += 1
-        self.output = "output/" + self.path.split("/")[-1].split(".")[0]
-        self.nbins = 50
-        self.norm = "linear"
-        self.ops = list()
-        self.all_ops = {"read", "write"}
+        options, levels = self.parse_feature_options(downsample=False)
+        self.set_feature_options(options, levels)
 
-        while self.i < len(self.argv):
-            arg = self.argv[self.i]
-            if arg == "-output":
-                self.output = self.argv[self.i + 1]
-                self.i += 2
-                continue
-
-            if arg == "-norm":
-                self.norm = self.argv[self.i + 1]
-                self.i += 2
-                continue
-
-            if arg.isdigit():
-                self.nbins = int(arg)
-                self.i += 1
-                continue
-
-            if arg in self.all_ops:
-                self.ops += {arg}
-                self.i += 1
-                continue
+        self.log("=" * 100 + "\nStart {} aggregate info\n".format(self.ops))
 
-            break
+        self.matrix = self.aggregate()
+        self.render_levels(self.matrix, "to_plot")
+        return
 
-        if len(self.ops) == 0:
-            self.ops = self.all_ops
+    def aggregate(self):
+        """
+        Returns the AggregateInfo of each op (and of each level of the time axis) of the feature, they are not rendered
+        """
+        self.read_dxt_posix()
 
-        print("=" * 100 + "\nStart {} aggregate info\n".format(self.ops))
+        from AggregateInfo import AggregateInfo
 
-        start_t = time.time()
-        self.len_dxt_posix = 0
-        self.len_posix = 0
-        self.hostnames = set()
-        self.file_ids = set()
-        for f in self.files:
-            self.len_dxt_posix += f.get_dxt_posix()
-            self.len_posix += f.get_posix()
-            for e in f.dxt_posix:
-                self.hostnames.add(e["hostname"])
-                self.file_ids.add(e["id"])
-        self.hostnames = list(self.hostnames)
-        self.file_ids = list(self.file_ids)
-
-        print("Read and convert all data in %.3f sec\n" % (time.time() - start_t))
-
-        self.step = self.duration / self.nbins
-        self.matrix = list()
+        self.set_time_axis("aggregate_info")
+        matrices = list()
         for op in self.ops:
             self.op = op
-            print("=" * 50 + "\nStart generating {} heatmap".format(op))
+            for factor in self.factors():
+                matrices.append(AggregateInfo(self, load=False, factor=factor))
+        self.fill(matrices)
+        return matrices
 
-            start_t = time.time()
-            self.matrix.append(AggregateInfo(self))
-            print("Generate sparse matrix in %.3f sec" % (time.time() - start_t))
+    def concurrency_info(self):
+        self.i += 1
+        options, levels = self.parse_feature_options(downsample=False)
+        self.set_feature_options(options, levels)
 
-            start_t = time.time()
-            self.matrix[-1].to_plot(self)
-            print("Generate heatmap in %.3f sec" % (time.time() - start_t))
+        self.log("=" * 100 + "\nStart {} concurrency\n".format(self.ops))
 
+        self.matrix = self.concurrency()
+        self.render_levels(self.matrix, "to_plot")
         return
+
+    def concurrency(self):
+        """
+        Returns the Concurrency of each op of the feature, they are not rendered
+        """
+        self.read_dxt_posix(posix=False)
+
+        from Concurrency import Concurrency
+
+        self.set_time_axis("concurrency")
+        matrices = list()
+        for op in self.ops:
+            self.op = op
+            matrices.append(Concurrency(self, load=False))
+        self.fill(matrices)
+        return matrices
+
+
+def fill_shard(info, matrices, f, table):
+    """
+    Adds one shard of the segments to (empty) matrices, it is run by the workers of DarshanInfo.fill_parallel.
+    Returns the matrices and the spans of the profiler
+    """
+    profiler.start_worker(info.profile)
+    with profiler.span("bin shard", file=f.file):
+        profiler.count("segments", len(table))
+        for m in matrices:
+            m.add(info, f, table)
+    # the binning kept for the matrices of the same pass is not sent back
+    for m in matrices:
+        getattr(m, "shared", dict()).clear()
+    return matrices, profiler.drain()
+
+
+def use_agg_backend():
+    import matplotlib
+
+    matplotlib.use("Agg")
+
+
+def render_figure(info, m, method):
+    """
+    Renders and saves the figure of m (m.to_heatmap or m.to_plot), it is run by the workers of DarshanInfo.render.
+    Returns the time spent and the spans of the profiler
+    """
+    profiler.start_worker(info.profile)
+    start_t = time.time()
+    with profiler.span("render", method=method, op=m.op, output=info.output):
+        getattr(m, method)(info)
+    return time.time() - start_t, profiler.drain()
@@ -1,95 +1,229 @@
-import array
 import numpy as np
-import matplotlib.pyplot as plt
+import scipy.sparse as sp
 
-from SparseMatrix import SparseMatrix
+from SparseMatrix import (
+    downsample_rows,
+    log_downsample,
+    pixel_height,
+    write_raster,
+    top_rows,
+    select_entries,
+)
+from MatrixData import row_title, save_data
+from Binning import bin_segments
 
 """
 This class is used to create a heatmap that shows the number of ranks that access a file each second.
+With -top, only the files with the most accesses (the sum of the number of ranks of their bins) are kept, see select_rows.
 """
 
 
 class FileNbRankPerSec:
-    def __init__(self, info):
-        self.shape = (info.len_dxt_posix, info.nbins + 1)
-        self.x = [array.array("I") for i in range(info.nprocs)]
-        self.y = [array.array("I") for i in range(info.nprocs)]
-        self.value = [array.array("I") for i in range(info.nprocs)]
-        self.get_data(info)
+    def __init__(self, info, load=True, factor=1, shared=None):
+        """
+        The bins of the matrix are factor bins of info (see DarshanInfo.render_levels), the number of ranks per file
+        can't be summed from smaller bins, so each level is counted from the segments.
+        The matrices filled in the same pass can give the same dict shared, so that the segments are binned once per table and op.
+        """
+        self.op = info.op
+        self.factor = factor
+        self.mat = None
+        # the files that are kept with -top (by decreasing accesses), and whether the last row is the sum of the others
+        self.rows = None
+        self.other = False
+        self.shared = shared if shared is not None else dict()
+        if load:
+            self.get_data(info)
 
     def get_data(self, info):
-        temps_nprocs = 0
-        op_segment = info.op + "_segments"
-        for f in info.files:
-            for e in f.dxt_posix:
-                x = info.file_ids.index(e["id"])
-                if not e[op_segment].empty:
-                    df = e[op_segment]
-                    for line in df.values:
-                        idx_beg = int(line[2] // info.step)
-                        duration = line[3] - line[2]
-                        length = int(duration // info.step + 1)
-                        if idx_beg + length > info.nbins:
-                            print(line[2], line[3], info.step, info.duration)
-                            print(
-                                "Warning : the segment is out of the range of the histogram"
-                            )
-                            length = info.nbins - idx_beg
-
-                        for it in range(length):
-                            self.x[temps_nprocs + e["rank"]].append(x)
-                            self.y[temps_nprocs + e["rank"]].append(idx_beg + it)
-                            self.value[temps_nprocs + e["rank"]].append(1)
-            temps_nprocs += f.nprocs
-
-        self.rank_mat = [
-            SparseMatrix(
-                info,
-                self.value[i],
-                self.x[i],
-                self.y[i],
-                shape=self.shape,
-                dtype="int32",
-            )
-            for i in range(info.nprocs)
-        ]
+        for f, table in info.iter_segments():
+            self.add(info, f, table)
+        self.finish(info)
+        return
+
+    def finish(self, info):
+        # the tables kept for the matrices of the same pass are not needed anymore
+        self.shared.clear()
+        nrows = len(info.file_ids) if self.rows is None else len(self.rows) + self.other
+        self.shape = (nrows, -(-info.nbins // self.factor) + 1)
+        if self.mat is None:
+            self.mat = sp.csr_matrix(self.shape, dtype="int32")
+        self.mat.resize(self.shape)
+        return
+
+    def get_bins(self, info, table):
+        """
+        Returns (mask, seg, bins) the binning of the segments of the table for self.op (see Binning.bin_segments)
+        """
+        if self.shared.get(self.op, (None,))[0] is table:
+            return self.shared[self.op][1]
+
+        mask = table.op_mask(self.op)
+        seg, bins, _ = bin_segments(
+            table.start[mask],
+            table.end[mask],
+            info.step,
+            info.nbins,
+            clip=info.windowed,
+        )
+        self.shared[self.op] = (table, (mask, seg, bins))
+        return mask, seg, bins
+
+    def select_rows(self, info):
+        """
+        Keeps the info.top files with the most accesses, by decreasing accesses, and sums the other files in a last row
+        with info.top_other. It is called before finish (see DarshanInfo.fill), each level of the time axis ranks its own files
+        """
+        if self.mat is None:
+            return
+        mat = self.mat.tocoo()
+        nrows = len(info.file_ids)
+        rows = top_rows(mat.row, mat.data, nrows, info.top)
+        if rows is None:
+            return
 
-        for i in range(info.nprocs):
-            self.rank_mat[i].mat.data = np.ones(
-                len(self.rank_mat[i].mat.data), dtype="int32"
+        x, keep = select_entries(mat.row, rows, nrows, info.top_other)
+        # (the csr matrix sums the numbers of ranks of the other files in the same bin)
+        self.mat = sp.csr_matrix(
+            (mat.data[keep], (x, mat.col[keep])),
+            shape=(len(rows) + info.top_other, mat.shape[1]),
+            dtype="int32",
+        )
+        self.rows, self.other = rows, info.top_other
+        info.log(
+            "Keep the {} files with the most accesses out of {}".format(
+                len(rows), nrows
             )
-        self.mat = self.rank_mat[0].mat.tocsr()
-        for i in range(1, info.nprocs):
-            self.mat += self.rank_mat[i].mat.tocsr()
+        )
+        return
+
+    def add(self, info, f, table):
+        """
+        Bins the segments of a table (a whole file, or a chunk of it in streaming mode)
+        and adds the number of ranks per file of each bin to the matrix.
+        A table always holds whole records, so a (file, rank) pair is never split between two tables.
+        """
+        mask, seg, bins = self.get_bins(info, table)
+        x = table.file_codes[table.file[mask]][seg].astype(np.int64)
+        y = bins // self.factor
+        rank = f.rank_offset + table.rank[mask][seg]
+        shape = (len(info.file_ids), -(-info.nbins // self.factor) + 1)
+
+        # the (file, bin, rank) triples are packed in one key and deduplicated,
+        # then the distinct ranks are counted per (file, bin)
+        cell = x * shape[1] + y
+        triples = np.unique(cell * info.nprocs + rank)
+        cell, count = np.unique(triples // info.nprocs, return_counts=True)
+        mat = sp.csr_matrix(
+            (count.astype("int32"), (cell // shape[1], cell % shape[1])),
+            shape=shape,
+            dtype="int32",
+        )
+
+        self.add_matrix(mat)
+        return
+
+    def merge(self, info, other):
+        """
+        Adds the matrix of other (the same matrix filled with another shard of the segments) to self.
+        The shards never share a rank, so the numbers of ranks of the shards can be summed.
+        """
+        if other.mat is not None:
+            self.add_matrix(other.mat)
+        return
+
+    def add_matrix(self, mat):
+        if self.mat is None:
+            self.mat = mat
+            return
+        shape = tuple(np.maximum(self.mat.shape, mat.shape))
+        self.mat.resize(shape)
+        mat.resize(shape)
+        self.mat += mat
+        return
+
+    def data_name(self):
+        if self.factor != 1:
+            return "{}_nrank_x{}".format(self.op, self.factor)
+        return "{}_nrank".format(self.op)
 
+    def save_data(self, info, prefix=None):
+        mat = self.mat.tocoo()
+        save_data(
+            info,
+            self,
+            self.data_name(),
+            {
+                "shape": np.array(self.shape),
+                "factor": np.array(self.factor),
+                "x": mat.row,
+                "y": mat.col,
+                "v": mat.data,
+            },
+            prefix,
+        )
         return
 
+    @classmethod
+    def load_data(cls, info, data):
+        m = cls(info, load=False)
+        m.op = data["op"]
+        m.factor = int(data.get("factor", 1))
+        m.shape = tuple(data["shape"])
+        m.rows, m.other = data.get("rows"), data.get("other", False)
+        m.mat = sp.csr_matrix(
+            (data["v"], (data["x"], data["y"])), shape=m.shape, dtype="int32"
+        )
+        return m
+
     def to_heatmap(self, info):
+        import matplotlib.pyplot as plt
+
         fig, axs = plt.subplots(1, 1)
-        fig.suptitle(
-            "Heatmap of the number of {}s on the same file".format(info.op)
-        )
-        extent = [0, info.duration, 0, info.len_dxt_posix]
+        fig.suptitle("Heatmap of the number of {}s on the same file".format(self.op))
+        extent = [info.tstart, info.tend, 0, self.shape[0]]
         vmax = max(self.mat.data) if len(self.mat.data) > 0 else 0
         norm = info.norm
 
         def plot_heatmap(self, ax, title):
+            array, self.row_groups = downsample_rows(
+                self.mat, pixel_height(ax), info.downsample
+            )
             ax.imshow(
-                self.mat.toarray(),
+                array,
                 aspect="auto",
-                cmap="Reds",
+                cmap=info.cmap,
                 interpolation="nearest",
                 origin="lower",
                 extent=extent,
                 norm=norm,
-                vmax=vmax,
+                vmax=vmax if self.row_groups is None else array.max(initial=0),
             )
             ax.set_title(title)
             ax.grid(True)
             ax.set_xlabel("Time ({} s)".format(info.step))
-            ax.set_ylabel("File")
+            ax.set_ylabel(row_title("File", self.rows, self.other))
 
-        plot_heatmap(self, axs, str(info.op))
+        plot_heatmap(self, axs, str(self.op))
         fig.colorbar(axs.images[0], ax=axs)
         fig.tight_layout()
-        fig.savefig("{}_{}_nrank.png".format(info.output, info.op))
+        fig.savefig("{}_{}_nrank.png".format(info.output, self.op))
+        plt.close(fig)
+        log_downsample(info, self.shape[0], self.row_groups)
+
+    def to_raster(self, info):
+        """
+        Writes the heatmap as a PNG image without figure (see SparseMatrix.write_raster)
+        """
+        self.row_groups = write_raster(
+            self.mat,
+            "{}_{}_nrank".format(info.output, self.op),
+            str(self.op),
+            [info.tstart, info.tend, 0, self.shape[0]],
+            info.norm,
+            None,
+            info.downsample,
+            info.cmap,
+        )
+        log_downsample(info, self.shape[0], self.row_groups)
+        return
@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+
+"""
+This class is the state of the incremental mode (used by DarshanInfo with -incremental), it is kept in a directory :
+    - manifest.json : the darshan files already processed, and the indexes of the rows they use
+      (the rank offset of each darshan file, the file ids and the hostnames), the time range of all the files
+      and, for each feature, its number of bins and time step, and the version (size and modification time) of each processed file
+      with the time step of its partial data
+    - <feature>/<darshan file>_<op>_<group>.npz : the partial data of each darshan file for each matrix of the feature (see MatrixData)
+
+The number of bins of a feature is fixed by its first run. When the time range grows beyond the bins, the time step is doubled
+(as many times as needed) and the partial data, whose bins do not match anymore, are computed again (rebased) from the records.
+So the bins are rebased only when the time range doubles, and not each time it grows.
+When a processed darshan file is not in a run anymore (removed, or not selected with -job, -since, ...), the rows of the other files
+would not be the same, so the state is emptied and the darshan files of the run are processed again (see remove_missing).
+"""
+
+
+class IncrementalState:
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = os.path.join(directory, "manifest.json")
+        os.makedirs(directory, exist_ok=True)
+        if os.path.exists(self.path):
+            with open(self.path) as manifest:
+                self.manifest = json.load(manifest)
+        else:
+            self.manifest = empty_manifest()
+
+    def save(self):
+        tmp = "{}.{}.tmp".format(self.path, os.getpid())
+        with open(tmp, "w") as manifest:
+            json.dump(self.manifest, manifest, indent=4)
+        os.replace(tmp, self.path)
+        return
+
+    def version(self, path):
+        stat = os.stat(path)
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def remove_missing(self, paths):
+        """
+        Removes from the state the darshan files that are not in paths and their partial data. The rank offsets, the file ids,
+        the hostnames and the time range of the other files then change, so the whole state is emptied (with all the partial data)
+        and the darshan files of paths are added again by add_log and processed again. Returns the removed darshan files
+        """
+        paths = {os.path.abspath(path) for path in paths}
+        removed = [path for path in self.manifest["logs"] if path not in paths]
+        if len(removed) == 0:
+            return removed
+
+        for name in self.manifest["features"]:
+            directory = os.path.join(self.directory, name)
+            if os.path.isdir(directory):
+                shutil.rmtree(directory)
+        self.manifest = empty_manifest()
+        return removed
+
+    def add_log(self, f):
+        """
+        Gives its rank offset to the DarshanFile f : the offset of its previous version if it has the same number of ranks,
+        otherwise its ranks are added after all the known ranks
+        """
+        path = os.path.abspath(f.path)
+        log = self.manifest["logs"].get(path)
+        if log is None or log["nprocs"] != f.nprocs:
+            log = {"rank_offset": self.manifest["nprocs"], "nprocs": f.nprocs}
+            self.manifest["logs"][path] = log
+            self.manifest["nprocs"] += f.nprocs
+        f.rank_offset = log["rank_offset"]
+        start, end = f.start_time.timestamp(), f.end_time.timestamp()
+        if self.manifest["start"] is None or start < self.manifest["start"]:
+            self.manifest["start"] = start
+        if self.manifest["end"] is None or end > self.manifest["end"]:
+            self.manifest["end"] = end
+        return
+
+    def feature(self, name):
+        return self.manifest["features"].setdefault(
+            name, {"nbins": None, "step": None, "logs": dict()}
+        )
+
+    def time_axis(self, name, duration, nbins):
+        """
+        Returns (nbins, step) the time axis of the feature name : the step of the first run, doubled until the bins cover the duration
+        """
+        state = self.feature(name)
+        if state["step"] is None:
+            state["nbins"] = nbins
+            state["step"] = duration / nbins
+        # (the tolerance keeps the step of the first run)
+        while state["nbins"] * state["step"] < duration * (1 - 1e-9):
+            state["step"] *= 2
+        return max(int(np.ceil(duration / state["step"] - 1e-9)), 1), state["step"]
+
+    def prefix(self, name, path):
+        """
+        Returns the prefix of the partial data of the darshan file path for the feature name
+        """
+        directory = os.path.join(self.directory, name)
+        os.makedirs(directory, exist_ok=True)
+        digest = hashlib.blake2b(
+            os.path.abspath(path).encode(), digest_size=10
+        ).hexdigest()
+        return os.path.join(directory, digest)
+
+    def is_stale(self, name, path, data_names):
+        """
+        Returns True if the darshan file path is new or has changed since the feature name was computed,
+        if its partial data are not on the current time axis or if the partial data of one of its matrices (data_names) is missing
+        """
+        state = self.feature(name)
+        version = state["logs"].get(os.path.abspath(path))
+        if version != self.version(path) + [state["step"]]:
+            return True
+        prefix = self.prefix(name, path)
+        return not all(
+            os.path.exists("{}_{}.npz".format(prefix, data_name))
+            for data_name in data_names
+        )
+
+    def set_processed(self, name, path):
+        state = self.feature(name)
+        state["logs"][os.path.abspath(path)] = self.version(path) + [state["step"]]
+        return
+
+    def partials(self, name, data_name):
+        """
+        Returns the paths of the partial data of all the processed darshan files for the matrix data_name of the feature name.
+        The partial data that are missing, and that are not on the current time axis, are skipped
+        (the darshan files that are not in the run have been removed by remove_missing).
+        """
+        state = self.feature(name)
+        paths = list()
+        for path, version in sorted(state["logs"].items()):
+            partial = "{}_{}.npz".format(self.prefix(name, path), data_name)
+            if version[-1] == state["step"] and os.path.exists(partial):
+                paths.append(partial)
+        return paths
+
+    def off_axis(self, name):
+        """
+        Returns the processed darshan files whose partial data of the feature name are not on the current time axis (they are skipped by partials)
+        """
+        state = self.feature(name)
+        return [
+            path
+            for path, version in sorted(state["logs"].items())
+            if version[-1] != state["step"]
+        ]
+
+
+def empty_manifest():
+    return {
+        "logs": dict(),
+        "file_ids": list(),
+        "hostnames": list(),
+        "nprocs": 0,
+        "start": None,
+        "end": None,
+        "features": dict(),
+    }
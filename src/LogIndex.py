@@ -0,0 +1,173 @@
+import datetime
+import os
+import sqlite3
+
+"""
+This class is an index of the headers of darshan files in a SQLite database (used by DarshanInfo with -index), so that the darshan files
+can be selected (by time range, job id or modules) and their headers known without opening their reports.
+For each darshan file, it keeps its version (size and modification time), the job id, the uid, the number of processes,
+the start and end times, the number of file names (the records are identified by their names) and, for each module,
+the size of its region in the log (the header has no number of records), its version and whether it is partial.
+A scan only reads the headers of the darshan files that are new or have changed since the last scan.
+"""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS logs (
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime_ns INTEGER,
+    job_id INTEGER,
+    uid INTEGER,
+    nprocs INTEGER,
+    start_time REAL,
+    end_time REAL,
+    nb_names INTEGER,
+    log_version TEXT
+);
+CREATE TABLE IF NOT EXISTS modules (
+    path TEXT REFERENCES logs(path) ON DELETE CASCADE,
+    module TEXT,
+    size INTEGER,
+    version INTEGER,
+    partial INTEGER,
+    PRIMARY KEY (path, module)
+);
+CREATE INDEX IF NOT EXISTS logs_time ON logs (start_time, end_time);
+CREATE INDEX IF NOT EXISTS modules_module ON modules (module);
+"""
+
+
+def parse_time(value):
+    """
+    Returns the timestamp of a time given in seconds since the epoch or as an ISO date (e.g. 2020-04-21T09:45:33)
+    """
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.datetime.fromisoformat(value).timestamp()
+
+
+def read_header(path):
+    """
+    Returns the header of the darshan file path : (job, modules, number of file names), the records are not read
+    """
+    import darshan.backend.cffi_backend as backend
+
+    log = backend.log_open(path)
+    try:
+        job = backend.log_get_job(log)
+        modules = backend.log_get_modules(log)
+        nb_names = len(backend.log_get_name_records(log))
+    finally:
+        backend.log_close(log)
+    return job, modules, nb_names
+
+
+class LogIndex:
+    def __init__(self, path=":memory:"):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA foreign_keys = ON")
+        self.db.executescript(SCHEMA)
+
+    def scan(self, paths):
+        """
+        Reads the headers of the darshan files that are not in the index or have changed,
+        and removes the darshan files of the same directories that do not exist anymore. Returns the number of headers read
+        """
+        paths = [os.path.abspath(path) for path in paths]
+        known = {
+            path: (size, mtime_ns)
+            for path, size, mtime_ns in self.db.execute(
+                "SELECT path, size, mtime_ns FROM logs"
+            )
+        }
+        nb_read = 0
+        with self.db:
+            for path in paths:
+                stat = os.stat(path)
+                if known.get(path) == (stat.st_size, stat.st_mtime_ns):
+                    continue
+                self.add(path, stat)
+                nb_read += 1
+
+            # (the darshan files that are not scanned, e.g. the other files of a directory, are kept if they still exist)
+            directories = {os.path.dirname(path) for path in paths}
+            for path in known:
+                if os.path.dirname(path) in directories and not os.path.exists(path):
+                    self.db.execute("DELETE FROM logs WHERE path = ?", (path,))
+        return nb_read
+
+    def add(self, path, stat):
+        job, modules, nb_names = read_header(path)
+        self.db.execute("DELETE FROM logs WHERE path = ?", (path,))
+        self.db.execute(
+            "INSERT INTO logs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                path,
+                stat.st_size,
+                stat.st_mtime_ns,
+                job["jobid"],
+                job["uid"],
+                job["nprocs"],
+                job["start_time_sec"],
+                job["end_time_sec"],
+                nb_names,
+                job.get("log_ver"),
+            ),
+        )
+        self.db.executemany(
+            "INSERT INTO modules VALUES (?, ?, ?, ?, ?)",
+            [
+                (path, name, m["len"], m["ver"], int(m["partial_flag"]))
+                for name, m in modules.items()
+            ],
+        )
+        return
+
+    def select(self, paths, job_ids=None, modules=None, since=None, until=None):
+        """
+        Returns the paths (among paths) of the darshan files of one of the job_ids, that have all the modules
+        and that run during [since, until] (timestamps)
+        """
+        query = "SELECT path FROM logs WHERE 1"
+        args = list()
+        if job_ids:
+            query += " AND job_id IN ({})".format(", ".join("?" * len(job_ids)))
+            args += job_ids
+        for module in modules or list():
+            query += " AND path IN (SELECT path FROM modules WHERE module = ?)"
+            args.append(module)
+        if since is not None:
+            query += " AND end_time >= ?"
+            args.append(since)
+        if until is not None:
+            query += " AND start_time <= ?"
+            args.append(until)
+        selected = {path for (path,) in self.db.execute(query, args)}
+        return [path for path in paths if os.path.abspath(path) in selected]
+
+    def header(self, path):
+        """
+        Returns the header of a darshan file of the index, as the attributes of DarshanFile (nprocs, start_time, end_time, modules)
+        """
+        path = os.path.abspath(path)
+        nprocs, start_time, end_time = self.db.execute(
+            "SELECT nprocs, start_time, end_time FROM logs WHERE path = ?", (path,)
+        ).fetchone()
+        modules = [
+            module
+            for (module,) in self.db.execute(
+                "SELECT module FROM modules WHERE path = ? ORDER BY rowid", (path,)
+            )
+        ]
+        return {
+            "nprocs": nprocs,
+            "start_time": datetime.datetime.fromtimestamp(start_time),
+            "end_time": datetime.datetime.fromtimestamp(end_time),
+            "modules": modules,
+        }
+
+    def close(self):
+        self.db.close()
+        return
@@ -0,0 +1,108 @@
+import sys
+
+import numpy as np
+
+"""
+This module writes and reads the binned data of the features (RW_SparseMatrix, FileNbRankPerSec, AggregateInfo, Concurrency) with -save-data,
+so that they can be plotted again with replot (see Replot) without reading the darshan files.
+Each file is a numpy .npz with the arrays of the feature and its axis :
+    - feature, op, group : the class, the type of operation and the group of the rows
+    - labels : the label of each row (the rank, the file id or the hostname)
+    - rows, other : with -top, the rows of the group that are kept and whether the last row is the sum of the others
+    - step, duration, nbins, tstart, tend : the time axis
+    - output : the output prefix of the figures
+"""
+
+# the aggregations of the rows of the tall heatmaps (see SparseMatrix.downsample_rows)
+DOWNSAMPLING = ("sum", "max", "mean", "none")
+# the norms of the figures (the scales of matplotlib.pyplot.imshow that don't need functions), the rasters only have the first three
+NORMS = ("linear", "log", "symlog", "logit", "asinh")
+RASTER_NORMS = NORMS[:3]
+
+
+def check_figure_options(norm, downsample=None, raster=False):
+    """
+    Exits if the norm (or the downsampling method) of the figures is not available,
+    they are checked when they are parsed and not when the first figure is rendered
+    """
+    norms = RASTER_NORMS if raster else NORMS
+    if norm not in norms:
+        print("Wrong norm : {} (the norms are {})".format(norm, ", ".join(norms)))
+        sys.exit(1)
+    if downsample is not None and downsample not in DOWNSAMPLING:
+        print(
+            "Wrong downsampling method : {} (the methods are {})".format(
+                downsample, ", ".join(DOWNSAMPLING)
+            )
+        )
+        sys.exit(1)
+    return
+
+
+def row_labels(info, group, rows=None):
+    """
+    Returns the label of each row of the group, or of the rows kept with -top (rows, without the row of the others)
+    """
+    if group == "rank":
+        labels = np.arange(info.nprocs)
+    elif group == "file":
+        labels = np.asarray(info.file_ids, dtype=np.uint64)
+    elif group == "hostname":
+        labels = np.array(info.hostnames, dtype=str)
+    else:
+        return np.zeros(0)
+    return labels if rows is None else labels[rows]
+
+
+def row_title(group, rows=None, other=False):
+    """
+    Returns the label of the row axis of the heatmaps
+    """
+    if rows is None:
+        return group
+    return "top {} {}s{}".format(
+        len(rows), group, " (last row : others)" if other else ""
+    )
+
+
+def save_data(info, m, name, arrays, prefix=None):
+    """
+    Writes the arrays of the feature m and its axis in {prefix}_{name}.npz (by default the prefix is info.output)
+    """
+    group = getattr(m, "group", "")
+    rows = getattr(m, "rows", None)
+    if rows is not None:
+        arrays = dict(arrays, rows=rows, other=np.array(m.other))
+    path = "{}_{}.npz".format(info.output if prefix is None else prefix, name)
+    np.savez_compressed(
+        path,
+        feature=np.array(type(m).__name__),
+        op=np.array(m.op),
+        group=np.array(group),
+        labels=row_labels(info, group, rows),
+        step=np.array(info.step),
+        duration=np.array(info.duration),
+        tstart=np.array(info.tstart),
+        tend=np.array(info.tend),
+        nbins=np.array(info.nbins),
+        output=np.array(info.output),
+        **arrays
+    )
+    info.log("Save the data in {}".format(path))
+    return
+
+
+def load_data(path):
+    with np.load(path) as data:
+        arrays = {k: data[k] for k in data.files}
+    for k in ("feature", "op", "group", "output"):
+        arrays[k] = str(arrays[k])
+    # (the files saved before the time window have no tstart and tend)
+    arrays.setdefault("tstart", 0.0)
+    arrays.setdefault("tend", arrays["duration"])
+    for k in ("step", "duration", "tstart", "tend"):
+        arrays[k] = float(arrays[k])
+    arrays["nbins"] = int(arrays["nbins"])
+    if "other" in arrays:
+        arrays["other"] = bool(arrays["other"])
+    return arrays
@@ -1,47 +1,94 @@
+import copy
+import numpy as np
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
 
 """
 This class shows in a tabular several information about the metadata operations that are not associated with I/O operations.
+The POSIX records without read and write of all the darshan files are grouped by their first non-zero counter
+(the columns id, rank and the POSIX_F_ times are not counters), and the summary of each group (describe and sum of its non-zero columns)
+is written in <output>_meta_posix_<counter>.csv
 """
 
+KEYS = ("id", "rank")
+STATISTICS = ("count", "mean", "std", "min", "25%", "50%", "75%", "max", "sum")
+
 
 class MetadataWithout_IO:
     def __init__(self, info):
-        info.files[0].posix = pd.merge(
-            info.files[0].posix["counters"],
-            info.files[0].posix["fcounters"],
-            on=["rank", "id"],
-        )
-        self.meta_posix = info.files[0].posix[
-            (
-                (info.files[0].posix["POSIX_READS"] == 0)
-                & (info.files[0].posix["POSIX_WRITES"] == 0)
-            )
-        ]
-        self.meta_posix = self.meta_posix.drop(
-            self.meta_posix.columns[self.meta_posix.eq(0).all()], axis=1
-        )
+        files = [f for f in info.files if f.posix is not None]
+        if info.jobs > 1 and len(files) > 1:
+            with ProcessPoolExecutor(max_workers=info.jobs) as pool:
+                frames = list(pool.map(meta_records, [light_copy(f) for f in files]))
+        else:
+            frames = [meta_records(f) for f in files]
+
+        if len(frames) == 0:
+            self.meta_posix = pd.DataFrame(columns=list(KEYS))
+        elif len(frames) == 1:
+            self.meta_posix = frames[0]
+        else:
+            # (the columns are the same for the darshan files of the same version)
+            self.meta_posix = pd.concat(frames, ignore_index=True).fillna(0)
+        self.meta_posix = self.meta_posix.loc[:, ~self.meta_posix.eq(0).all()]
 
     def get_info(self, info):
-        i = 0
-        while i < len(self.meta_posix.columns):
-            col = self.meta_posix.columns[i]
-            if col != "id" and col != "rank" and col[0:8] != "POSIX_F_":
-                temp_posix = self.meta_posix[self.meta_posix[col] != 0]
-                temp_posix = temp_posix.drop(
-                    temp_posix.columns[temp_posix.eq(0).all()], axis=1
-                )
-                self.meta_posix = self.meta_posix[self.meta_posix[col] == 0]
-                self.meta_posix = self.meta_posix.drop(
-                    self.meta_posix.columns[self.meta_posix.eq(0).all()], axis=1
-                )
-                summary = temp_posix.describe()
-                sum_row = pd.DataFrame(
-                    temp_posix.sum().values.reshape(1, -1),
-                    columns=temp_posix.columns,
-                    index=["sum"],
-                )
-                summary = pd.concat([summary, sum_row])
-                summary.to_csv(info.output + "_meta_posix_" + col + ".csv")
-            else:
-                i += 1
+        counters = [
+            col
+            for col in self.meta_posix.columns
+            if col not in KEYS and col[0:8] != "POSIX_F_"
+        ]
+        if len(counters) == 0:
+            return
+        nonzero = self.meta_posix[counters].to_numpy() != 0
+        grouped = nonzero.any(axis=1)
+        # the group of a record is its first non-zero counter
+        group = nonzero.argmax(axis=1)[grouped]
+        meta_posix = self.meta_posix[grouped]
+
+        by_group = meta_posix.groupby(group)
+        quantiles = by_group.quantile([0.25, 0.5, 0.75])
+        statistics = {
+            "count": by_group.count(),
+            "mean": by_group.mean(),
+            "std": by_group.std(),
+            "min": by_group.min(),
+            "25%": quantiles.xs(0.25, level=1),
+            "50%": quantiles.xs(0.5, level=1),
+            "75%": quantiles.xs(0.75, level=1),
+            "max": by_group.max(),
+            "sum": by_group.sum(),
+        }
+        columns = meta_posix.ne(0).groupby(group).any()
+
+        for g in columns.index:
+            summary = pd.DataFrame(
+                [statistics[k].loc[g, columns.loc[g]] for k in STATISTICS],
+                index=STATISTICS,
+                dtype=np.float64,
+            )
+            summary.to_csv(info.output + "_meta_posix_" + counters[g] + ".csv")
+        return
+
+
+def meta_records(f):
+    """
+    Returns the POSIX records without read and write of the darshan file f, with the ranks of all the darshan files (rank offset).
+    It is run by the workers of MetadataWithout_IO with several jobs
+    """
+    posix = f.get_posix_merged()
+    meta = posix[((posix["POSIX_READS"] == 0) & (posix["POSIX_WRITES"] == 0))]
+    if f.rank_offset != 0:
+        meta = meta.copy()
+        # (the rank of the shared records is -1)
+        meta.loc[meta["rank"] >= 0, "rank"] += f.rank_offset
+    return meta
+
+
+def light_copy(f):
+    # only the POSIX records are sent to the workers
+    light = copy.copy(f)
+    light.segments = None
+    light.report = None
+    light.cache = None
+    return light
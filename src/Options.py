@@ -0,0 +1,37 @@
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+"""
+This class holds the options of the reading of the darshan files and of the binning of the features, without the options of the figures.
+It is filled from the command line by DarshanInfo, or given to the functions of DarshanAPI.
+"""
+
+
+@dataclass
+class Options:
+    # the time axis : the number of bins and the time window [tstart, tend) in seconds since the start (tend is the duration by default)
+    nbins: int = 50
+    tstart: float = 0.0
+    tend: Optional[float] = None
+    # the matrices : the types of operation and the groups of the rows (for bin_io)
+    ops: List[str] = field(default_factory=lambda: ["read", "write"])
+    groups: List[str] = field(default_factory=lambda: ["rank", "file", "hostname"])
+    # the rows of the heatmaps (for bin_io and ranks_per_file) : only the top rows by their totals of top_by (bytes, count or meta,
+    # ranks_per_file ranks the files by their accesses), and a last row that sums the other rows with top_other (all the rows by default)
+    top: Optional[int] = None
+    top_by: str = "bytes"
+    top_other: bool = False
+    # the reading of the darshan files (see DarshanInfo.parse_global_options)
+    jobs: int = 1
+    stream: Optional[int] = None
+    cache: Optional[str] = None
+    cache_size: int = 1024
+    incremental: Optional[str] = None
+    index: Optional[str] = None
+    # the selection of the darshan files by their headers (see LogIndex.select)
+    job_ids: List[int] = field(default_factory=list)
+    modules: List[str] = field(default_factory=list)
+    since: Optional[float] = None
+    until: Optional[float] = None
+    # the progress is printed on stdout
+    verbose: bool = True
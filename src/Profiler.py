@@ -0,0 +1,277 @@
+import contextlib
+import itertools
+import os
+import resource
+import sys
+import threading
+import time
+
+"""
+This module times the stages of darshan-info (read, convert, bin, render, ...) with nested spans, it replaces the timing prints.
+A span prints its message with the time spent (as before), and with -profile <prefix> (see DarshanInfo) it is also recorded with :
+    - the resident memory (RSS) at its end and the peak RSS during the span
+      (the peak of the process is reset at the start of each span when /proc/self/clear_refs is writable,
+      otherwise it is the peak of the process since its start)
+    - the number of memory blocks allocated by python during the span (sys.getallocatedblocks, net of the freed blocks)
+    - its counters (e.g. the segments processed, see count), with their rate per second
+When the profiler is closed, the spans are written in :
+    - <prefix>.json : the tree of the spans and the totals of each stage
+    - <prefix>.trace.json : the Chrome trace event format (chrome://tracing or https://ui.perfetto.dev)
+
+The spans of the workers of the process pools are recorded by the workers and sent back with their results (see drain and add_events).
+"""
+
+# the numbers of the spans, the id of a span is its pid and its number
+SPAN_NUMBERS = itertools.count()
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def rss():
+    """
+    Returns the resident memory of the process in bytes
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * PAGE_SIZE
+    except OSError:
+        return peak_rss()
+
+
+def peak_rss():
+    """
+    Returns the peak resident memory of the process in bytes (since the last reset_peak_rss)
+    """
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) << 10
+    except OSError:
+        pass
+    # (ru_maxrss is in kB on linux and in bytes on macOS)
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == "darwin" else maxrss << 10
+
+
+def reset_peak_rss():
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        pass
+    return
+
+
+class Profiler:
+    def __init__(self):
+        self.enabled = False
+        self.prefix = None
+        self.events = list()
+        self.stack = list()
+
+    def enable(self, prefix=None):
+        self.enabled = True
+        self.prefix = prefix
+        return
+
+    def start_worker(self, enabled):
+        """
+        Starts recording the spans of a worker of a process pool (a forked worker has a copy of the spans of the main process)
+        """
+        self.enabled = enabled
+        self.events = list()
+        self.stack = list()
+        return
+
+    @contextlib.contextmanager
+    def span(self, name, message=None, end="\n", **args):
+        """
+        Times the code in the with block as the stage name, and prints "<message> in <time> sec" at its end if there is a message.
+        The args are kept in the trace (e.g. the file or the op)
+        """
+        if not self.enabled:
+            start_t = time.perf_counter()
+            yield
+            if message is not None:
+                print(
+                    "{} in {:.3f} sec".format(message, time.perf_counter() - start_t),
+                    end=end,
+                )
+            return
+
+        event = {
+            "id": "{}:{}".format(os.getpid(), next(SPAN_NUMBERS)),
+            "parent": self.stack[-1]["id"] if len(self.stack) != 0 else None,
+            "name": name,
+            "args": args,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "counters": dict(),
+            "peak_rss": 0,
+        }
+        if len(self.stack) != 0:
+            # the peak of the parent before this span, the peak is reset for this span
+            parent = self.stack[-1]
+            parent["peak_rss"] = max(parent["peak_rss"], peak_rss())
+        reset_peak_rss()
+        self.stack.append(event)
+        blocks = sys.getallocatedblocks()
+        event["ts"] = time.time()
+        start_t = time.perf_counter()
+        try:
+            yield
+        finally:
+            event["dur"] = time.perf_counter() - start_t
+            event["allocated_blocks"] = sys.getallocatedblocks() - blocks
+            event["rss"] = rss()
+            event["peak_rss"] = max(event["peak_rss"], peak_rss())
+            self.stack.pop()
+            if len(self.stack) != 0:
+                parent = self.stack[-1]
+                parent["peak_rss"] = max(parent["peak_rss"], event["peak_rss"])
+            self.events.append(event)
+            if message is not None:
+                print("{} in {:.3f} sec".format(message, event["dur"]), end=end)
+        return
+
+    def count(self, name, n):
+        """
+        Adds n to the counter name of the current span (e.g. the number of segments that are binned)
+        """
+        if self.enabled and len(self.stack) != 0:
+            counters = self.stack[-1]["counters"]
+            counters[name] = counters.get(name, 0) + n
+        return
+
+    def drain(self):
+        """
+        Returns and forgets the recorded spans, the workers send them back to the main process with their results
+        """
+        events = self.events
+        self.events = list()
+        return events
+
+    def add_events(self, events):
+        """
+        Adds the spans of a worker, its root spans become children of the current span
+        """
+        parent = self.stack[-1]["id"] if len(self.stack) != 0 else None
+        for event in events:
+            if event["parent"] is None:
+                event["parent"] = parent
+            self.events.append(event)
+        return
+
+    def report(self):
+        """
+        Returns the report of the spans : the tree of the spans and the totals of each stage
+        """
+        nodes = dict()
+        for event in sorted(self.events, key=lambda event: event["ts"]):
+            nodes[event["id"]] = {
+                "name": event["name"],
+                "args": event["args"],
+                "pid": event["pid"],
+                "start": event["ts"],
+                "duration": event["dur"],
+                "rss_mb": event["rss"] / (1 << 20),
+                "peak_rss_mb": event["peak_rss"] / (1 << 20),
+                "allocated_blocks": event["allocated_blocks"],
+                "counters": {
+                    k: {
+                        "count": v,
+                        "per_sec": v / event["dur"] if event["dur"] > 0 else None,
+                    }
+                    for k, v in event["counters"].items()
+                },
+                "children": list(),
+            }
+        spans = list()
+        for event in sorted(self.events, key=lambda event: event["ts"]):
+            node = nodes[event["id"]]
+            if event["parent"] in nodes:
+                nodes[event["parent"]]["children"].append(node)
+            else:
+                spans.append(node)
+
+        stages = dict()
+        for event in self.events:
+            stage = stages.setdefault(
+                event["name"],
+                {"calls": 0, "total": 0.0, "peak_rss_mb": 0.0, "counters": dict()},
+            )
+            stage["calls"] += 1
+            stage["total"] += event["dur"]
+            stage["peak_rss_mb"] = max(
+                stage["peak_rss_mb"], event["peak_rss"] / (1 << 20)
+            )
+            for k, v in event["counters"].items():
+                stage["counters"][k] = stage["counters"].get(k, 0) + v
+        for stage in stages.values():
+            stage["counters"] = {
+                k: {
+                    "count": v,
+                    "per_sec": v / stage["total"] if stage["total"] > 0 else None,
+                }
+                for k, v in stage["counters"].items()
+            }
+        return {"command": sys.argv, "stages": stages, "spans": spans}
+
+    def trace(self):
+        """
+        Returns the spans in the Chrome trace event format (complete events, the times are in microseconds)
+        """
+        events = list()
+        for pid in sorted({event["pid"] for event in self.events}):
+            events.append(
+                {
+                    "name": "process_name",
+                    "ph": "M",
+                    "pid": pid,
+                    "args": {
+                        "name": (
+                            "main" if pid == os.getpid() else "worker {}".format(pid)
+                        )
+                    },
+                }
+            )
+        for event in self.events:
+            args = dict(event["args"])
+            args.update(event["counters"])
+            args["rss_mb"] = round(event["rss"] / (1 << 20), 3)
+            args["peak_rss_mb"] = round(event["peak_rss"] / (1 << 20), 3)
+            args["allocated_blocks"] = event["allocated_blocks"]
+            events.append(
+                {
+                    "name": event["name"],
+                    "cat": "darshan-info",
+                    "ph": "X",
+                    "ts": event["ts"] * 1e6,
+                    "dur": event["dur"] * 1e6,
+                    "pid": event["pid"],
+                    "tid": event["tid"],
+                    "args": args,
+                }
+            )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def close(self):
+        """
+        Writes the report and the trace of the spans (with -profile)
+        """
+        if not self.enabled or self.prefix is None:
+            return
+        import json
+
+        for path, content in (
+            ("{}.json".format(self.prefix), self.report()),
+            ("{}.trace.json".format(self.prefix), self.trace()),
+        ):
+            with open(path, "w") as out:
+                json.dump(content, out, indent=1, default=str)
+            print("Save the profile in {}".format(path))
+        self.events = list()
+        return
+
+
+profiler = Profiler()
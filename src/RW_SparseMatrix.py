@@ -1,9 +1,14 @@
-import array
-import scipy.sparse as sp
-import matplotlib.pyplot as plt
-import pandas as pd
+import numpy as np
 
-from SparseMatrix import SparseMatrix
+from SparseMatrix import (
+    SparseMatrix,
+    TOP_BY,
+    log_downsample,
+    top_rows,
+    select_entries,
+)
+from Binning import bin_contributions, sum_entries
+from MatrixData import row_title, save_data
 
 """
 This class is used to create a heatmap that shows : 
@@ -19,91 +24,114 @@ The options are :
     - group : the group by which the data will be grouped (rank, file, or hostname)
     - norm : the normalization of the heatmap (see matplotlib.pyplot.imshow documentation)
     - nbins : the number of bins for the heatmap (i.e the discretisation of the time axis)
+    - top : only the rows with the largest totals (bytes, count or meta) are kept, see select_rows
     - output : the name of the output repository
 """
 
 
 class RW_SparseMatrix:
-    def __init__(self, info):
-        self.shape = (self.get_X_size(info), info.nbins + 1)
-        self.x = array.array("I")
-        self.y = array.array("I")
-        self.v = array.array("L")
-        self.v_bw = array.array("d")
-        self.v_meta = array.array("d")
-        self.get_data(info)
+    def __init__(self, info, load=True, shared=None, factor=1):
+        """
+        If load is False, the matrix is empty, the tables are added with add() and the matrices built with finish()
+        (see DarshanInfo.fill). The matrices filled in the same pass can give the same dict shared,
+        so that the metadata time and the binning of the segments are only computed once per table, op and factor.
+        The bins of the matrix are factor bins of info (see DarshanInfo.render_levels), each level is binned from the segments
+        (a segment is counted once in a bin, whatever the number of finer bins it covers).
+        """
+        self.group = info.group
+        self.op = info.op
+        self.factor = factor
+        self.x = np.zeros(0, dtype=np.int64)
+        self.y = np.zeros(0, dtype=np.int64)
+        self.v = np.zeros(0, dtype=np.int64)
+        self.v_bw = np.zeros(0)
+        self.v_bw_count = np.zeros(0)
+        self.v_meta = np.zeros(0)
+        # the entries that are not summed yet with the accumulated ones (x, y, v, v_bw, v_bw_count, v_meta), see accumulate
+        self.pending = list()
+        self.nb_pending = 0
+        # the rows of the group that are kept with -top (by decreasing totals), and whether the last row is the sum of the others
+        self.rows = None
+        self.other = False
+        self.shared = shared if shared is not None else dict()
+        if load:
+            self.get_data(info)
 
     def get_X_size(self, info):
-        if info.group == "rank":
+        if self.rows is not None:
+            return len(self.rows) + self.other
+        if self.group == "rank":
             return info.nprocs
-        elif info.group == "file":
-            return info.len_dxt_posix
-        elif info.group == "hostname":
+        elif self.group == "file":
+            return len(info.file_ids)
+        elif self.group == "hostname":
             return len(info.hostnames)
-        print("Wrong group name : {}".format(info.group))
+        print("Wrong group name : {}".format(self.group))
         exit(1)
 
-    def get_x(self, info, e, temps_nprocs):
-        if info.group == "rank":
-            return temps_nprocs + e["rank"]
-        elif info.group == "file":
-            return info.file_ids.index(e["id"])
-        elif info.group == "hostname":
-            return info.hostnames.index(e["hostname"])
-        print("Wrong group name : {}".format(info.group))
+    def get_x(self, f, table):
+        if self.group == "rank":
+            return f.rank_offset + table.rank
+        elif self.group == "file":
+            return table.file_codes[table.file]
+        elif self.group == "hostname":
+            return table.host_codes[table.host]
+        print("Wrong group name : {}".format(self.group))
         exit(1)
 
+    def get_meta(self, f, table):
+        """
+        Returns the metadata time per operation of each record of the table
+        """
+        if self.shared.get("meta", (None,))[0] is table:
+            return self.shared["meta"][1]
+
+        meta = f.get_meta_time(table)
+        self.shared["meta"] = (table, meta)
+        return meta
+
+    def get_bins(self, info, f, table):
+        """
+        Returns (mask, seg, bins, v_bw, v_meta) the binning of the segments of the table for self.op (see Binning.bin_contributions)
+        """
+        key = (self.op, self.factor)
+        if self.shared.get(key, (None,))[0] is table:
+            return self.shared[key][1]
+
+        meta = self.get_meta(f, table)
+        mask = table.op_mask(self.op)
+        seg, bins, v_bw, v_meta = bin_contributions(
+            table.start[mask],
+            table.end[mask],
+            table.length[mask],
+            meta[table.record[mask]],
+            info.step * self.factor,
+            self.nbins(info),
+            clip=info.windowed,
+        )
+        if (v_meta > 1).any():
+            info.log("meta / length : {}".format(v_meta.max()))
+        self.shared[key] = (table, (mask, seg, bins, v_bw, v_meta))
+        return mask, seg, bins, v_bw, v_meta
+
     def get_data(self, info):
-        temps_nprocs = 0
-        op_segment = info.op + "_segments"
-        for f in info.files:
-            posix = pd.merge(
-                f.posix["counters"], f.posix["fcounters"], on=["id", "rank"]
-            )
-            meta_time = posix[
-                ((posix["POSIX_READS"] != 0) | (posix["POSIX_WRITES"] != 0))
-            ]
-            meta_time = meta_time.set_index(["id", "rank"])[
-                "POSIX_F_META_TIME"
-            ].to_dict()
-
-            for e in f.dxt_posix:
-                x = self.get_x(info, e, temps_nprocs)
-                meta = meta_time.get((e["id"], e["rank"]), 0) / (
-                    e["read_count"] + e["write_count"]
-                )
-                if meta == 0:
-                    print(
-                        "meta time has not been found for ({}, {})".format(
-                            e["id"], e["rank"]
-                        )
-                    )
-                if not e[op_segment].empty:
-                    df = e[op_segment]
-                    for line in df.values:
-                        idx_beg = int(line[2] // info.step)
-                        duration = line[3] - line[2]
-                        length = int(duration // info.step + 1)
-                        if idx_beg + length > info.nbins:
-                            print(line[2], line[3], info.step, info.duration)
-                            print(
-                                "Warning : the segment is out of the range of the histogram"
-                            )
-                            length = info.nbins - idx_beg
-
-                        for it in range(length):
-                            self.x.append(x)
-                            self.y.append(idx_beg + it)
-                            self.v.append(1)
-                            self.v_bw.append(line[1] / length)
-                            self.v_meta.append(meta / length)
-                            if meta / length > 1:
-                                print("meta / length : {}".format(meta / length))
-
-            temps_nprocs += f.nprocs
-
-        self.v_bw_count = [self.v_bw[i] / self.v[i] for i in range(len(self.v))]
+        for f, table in info.iter_segments():
+            self.add(info, f, table)
+        self.finish(info)
+        return
+
+    def nbins(self, info):
+        return -(-info.nbins // self.factor)
+
+    def finish(self, info):
+        # the tables kept for the matrices of the same pass are not needed anymore
+        self.shared.clear()
+        self.sum_pending(info)
+        self.shape = (self.get_X_size(info), self.nbins(info) + 1)
+        self.build(info)
+        return
 
+    def build(self, info):
         self.mat = SparseMatrix(
             info, self.v, self.x, self.y, shape=self.shape, dtype="int64"
         )
@@ -116,25 +144,171 @@ class RW_SparseMatrix:
         )
         return
 
+    def select_rows(self, info):
+        """
+        Keeps the info.top rows with the largest totals of info.top_by (bytes, count or meta), by decreasing totals,
+        and sums the other rows in a last row with info.top_other. It is called before finish, so only the kept rows are built
+        (and then plotted or saved)
+        """
+        if info.top_by not in TOP_BY:
+            print("Wrong ranking of the rows : {}".format(info.top_by))
+            exit(1)
+        self.sum_pending(info)
+        weights = {"bytes": self.v_bw, "count": self.v, "meta": self.v_meta}
+        nrows = self.get_X_size(info)
+        rows = top_rows(self.x, weights[info.top_by], nrows, info.top)
+        if rows is None:
+            return
+
+        # (with top_other, the entries of the other rows in the same bin are summed)
+        x, keep = select_entries(self.x, rows, nrows, info.top_other)
+        self.x, self.y, v, self.v_bw, self.v_bw_count, self.v_meta = sum_entries(
+            x,
+            self.y[keep],
+            self.nbins(info) + 1,
+            self.v[keep],
+            self.v_bw[keep],
+            self.v_bw_count[keep],
+            self.v_meta[keep],
+        )
+        self.v = v.astype(np.int64)
+        self.rows, self.other = rows, info.top_other
+        info.log(
+            "Keep the {} {}s with the most {} out of {}".format(
+                len(rows), self.group, info.top_by, nrows
+            )
+        )
+        return
+
+    def add(self, info, f, table):
+        """
+        Bins the segments of a table (a whole file, or a chunk of it in streaming mode)
+        and sums them with the entries that are already accumulated
+        """
+        mask, seg, bins, v_bw, v_meta = self.get_bins(info, f, table)
+        if len(seg) == 0:
+            return
+
+        # each entry is a single I/O, so the bandwidth per I/O is the bandwidth of the entry
+        v = np.ones(len(seg), dtype=np.int64)
+        v_bw_count = v_bw / v
+
+        self.accumulate(
+            info, self.get_x(f, table)[mask][seg], bins, v, v_bw, v_bw_count, v_meta
+        )
+        return
+
+    def merge(self, info, other):
+        """
+        Sums the entries of other (the same matrix filled with another shard of the segments) with self
+        """
+        other.sum_pending(info)
+        self.accumulate(
+            info, other.x, other.y, other.v, other.v_bw, other.v_bw_count, other.v_meta
+        )
+        return
+
+    def accumulate(self, info, x, y, v, v_bw, v_bw_count, v_meta):
+        """
+        Keeps the entries pending, they are summed with the accumulated entries when they are more than them :
+        an entry is summed again only when the accumulated entries have doubled, so the cost of the chunks of the streaming mode
+        follows the number of entries and the size of the matrix, not the number of chunks
+        """
+        self.pending.append((x, y, v, v_bw, v_bw_count, v_meta))
+        self.nb_pending += len(x)
+        if self.nb_pending > len(self.x):
+            self.sum_pending(info)
+        return
+
+    def sum_pending(self, info):
+        if len(self.pending) == 0:
+            return
+        accumulated = (self.x, self.y, self.v, self.v_bw, self.v_bw_count, self.v_meta)
+        columns = [
+            np.concatenate((column,) + pending)
+            for column, pending in zip(accumulated, zip(*self.pending))
+        ]
+        self.pending = list()
+        self.nb_pending = 0
+        self.x, self.y, v, self.v_bw, self.v_bw_count, self.v_meta = sum_entries(
+            columns[0], columns[1], self.nbins(info) + 1, *columns[2:]
+        )
+        self.v = v.astype(np.int64)
+        return
+
+    def data_name(self):
+        if self.factor != 1:
+            return "{}_{}_x{}".format(self.op, self.group, self.factor)
+        return "{}_{}".format(self.op, self.group)
+
+    def save_data(self, info, prefix=None):
+        save_data(
+            info,
+            self,
+            self.data_name(),
+            {
+                "shape": np.array(self.shape),
+                "factor": np.array(self.factor),
+                "x": self.x,
+                "y": self.y,
+                "v": self.v,
+                "v_bw": self.v_bw,
+                "v_bw_count": self.v_bw_count,
+                "v_meta": self.v_meta,
+            },
+            prefix,
+        )
+        return
+
+    @classmethod
+    def load_data(cls, info, data):
+        m = cls(info, load=False)
+        m.op, m.group = data["op"], data["group"]
+        m.factor = int(data.get("factor", 1))
+        m.shape = tuple(data["shape"])
+        m.rows, m.other = data.get("rows"), data.get("other", False)
+        for k in ("x", "y", "v", "v_bw", "v_bw_count", "v_meta"):
+            setattr(m, k, data[k])
+        m.build(info)
+        return m
+
     def to_heatmap(self, info):
+        import matplotlib.pyplot as plt
+
         fig, axs = plt.subplots(2, 2, figsize=(16, 8))
-        fig.suptitle("Heatmap of the {} I/O grouped by {}".format(info.op, info.group))
+        fig.suptitle("Heatmap of the {} I/O grouped by {}".format(self.op, self.group))
 
-        self.mat.plot_heatmap(axs[0, 0], str(info.op) + " count")
-        self.mat_bw.plot_heatmap(axs[0, 1], str(info.op) + " bandwidth")
-        self.mat_bw_count.plot_heatmap(axs[1, 0], str(info.op) + " bandwidth per I/O")
-        self.mat_meta.plot_heatmap(axs[1, 1], str(info.op) + " metadata")
+        self.mat.plot_heatmap(axs[0, 0], str(self.op) + " count")
+        self.mat_bw.plot_heatmap(axs[0, 1], str(self.op) + " bandwidth")
+        self.mat_bw_count.plot_heatmap(axs[1, 0], str(self.op) + " bandwidth per I/O")
+        self.mat_meta.plot_heatmap(axs[1, 1], str(self.op) + " metadata")
 
         fig.colorbar(axs[0, 0].images[0], ax=axs[0, 0])
         fig.colorbar(axs[0, 1].images[0], ax=axs[0, 1])
         fig.colorbar(axs[1, 0].images[0], ax=axs[1, 0])
         fig.colorbar(axs[1, 1].images[0], ax=axs[1, 1])
 
-        axs[0, 0].set_ylabel("{}".format(info.group))
-        axs[1, 0].set_ylabel("{}".format(info.group))
+        axs[0, 0].set_ylabel(row_title(self.group, self.rows, self.other))
+        axs[1, 0].set_ylabel(row_title(self.group, self.rows, self.other))
         axs[1, 0].set_xlabel("Time ({} s)".format(info.step))
         axs[1, 1].set_xlabel("Time ({} s)".format(info.step))
 
         fig.tight_layout()
-        fig.savefig("{}_{}_{}.png".format(info.output, info.op, info.group))
+        fig.savefig("{}_{}_{}.png".format(info.output, self.op, self.group))
+        plt.close(fig)
+        log_downsample(info, self.shape[0], self.mat.row_groups)
+        return
+
+    def to_raster(self, info):
+        """
+        Writes the 4 heatmaps as PNG images without figure (see SparseMatrix.write_raster)
+        """
+        output = "{}_{}_{}".format(info.output, self.op, self.group)
+        self.mat.to_raster(output + "_count", str(self.op) + " count")
+        self.mat_bw.to_raster(output + "_bw", str(self.op) + " bandwidth")
+        self.mat_bw_count.to_raster(
+            output + "_bw_count", str(self.op) + " bandwidth per I/O"
+        )
+        self.mat_meta.to_raster(output + "_meta", str(self.op) + " metadata")
+        log_downsample(info, self.shape[0], self.mat.row_groups)
         return
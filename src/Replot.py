@@ -0,0 +1,113 @@
+import importlib
+import os
+
+from MatrixData import check_figure_options, load_data
+from Profiler import profiler
+
+"""
+This class plots again the data saved with -save-data (see MatrixData), without reading the darshan files.
+It replaces DarshanInfo for the features : it has the same options (output, norm, cmap, ...)
+and the time axis and the op and group of each file.
+
+The options are :
+    - the .npz files or repositories of .npz files
+    - output : the output prefix of the figures, by default the figures are next to the .npz files
+    - norm : the normalization of the heatmaps (linear by default)
+    - cmap : the colormap of the heatmaps (Reds by default)
+    - downsample : the aggregation of the rows of tall heatmaps (sum by default)
+    - raster : writes the heatmaps as PNG images without figure
+    - profile : the prefix of the profile of the replot (see Profiler), it is written by main
+"""
+
+# the classes of the saved features, each one is in the module of the same name (it is imported by plot)
+FEATURES = ("RW_SparseMatrix", "FileNbRankPerSec", "AggregateInfo", "Concurrency")
+
+
+class Replot:
+    def __init__(self, argv):
+        self.paths = list()
+        self.prefix = None
+        self.norm = "linear"
+        self.cmap = "Reds"
+        self.downsample = "sum"
+        self.raster = False
+
+        i = 0
+        while i < len(argv):
+            if argv[i] == "-output":
+                self.prefix = argv[i + 1]
+                i += 2
+                continue
+            if argv[i] == "-norm":
+                self.norm = argv[i + 1]
+                i += 2
+                continue
+            if argv[i] == "-cmap":
+                self.cmap = argv[i + 1]
+                i += 2
+                continue
+            if argv[i] == "-downsample":
+                self.downsample = argv[i + 1]
+                i += 2
+                continue
+            if argv[i] == "-raster":
+                self.raster = True
+                i += 1
+                continue
+            if argv[i] == "-profile":
+                profiler.enable(argv[i + 1])
+                i += 2
+                continue
+            if os.path.isdir(argv[i]):
+                self.paths += [
+                    os.path.join(argv[i], filename)
+                    for filename in sorted(os.listdir(argv[i]))
+                    if filename.split(".")[-1] == "npz"
+                ]
+            else:
+                self.paths.append(argv[i])
+            i += 1
+        check_figure_options(self.norm, self.downsample, self.raster)
+
+    def log(self, *args, **kwargs):
+        # the progress of the features (see DarshanInfo.log), replot always prints it
+        print(*args, **kwargs)
+        return
+
+    def plot(self, path):
+        """
+        Plots the feature saved in path, returns the feature (None if the file is not a saved feature)
+        """
+        data = load_data(path)
+        if data["feature"] not in FEATURES:
+            print("The file {} is not a saved feature".format(path))
+            return None
+
+        self.op = data["op"]
+        self.group = data["group"]
+        self.step = data["step"]
+        self.duration = data["duration"]
+        self.tstart = data["tstart"]
+        self.tend = data["tend"]
+        self.nbins = data["nbins"]
+        self.output = self.prefix
+        if self.output is None:
+            self.output = os.path.join(
+                os.path.dirname(path), os.path.basename(data["output"])
+            )
+
+        feature = getattr(importlib.import_module(data["feature"]), data["feature"])
+        m = feature.load_data(self, data)
+        if hasattr(m, "to_plot"):
+            m.to_plot(self)
+        elif self.raster:
+            m.to_raster(self)
+        else:
+            m.to_heatmap(self)
+        return m
+
+    def plot_all(self):
+        for path in self.paths:
+            with profiler.span("replot", "Replot {}".format(path), path=path):
+                self.plot(path)
+        return
@@ -0,0 +1,189 @@
+import numpy as np
+
+"""
+This class is a flat columnar table of all the DXT_POSIX segments (read and write) of a darshan file, it is built once by DarshanFile.
+Each segment has integer columns (rank, file, host, op, record) and the offset, length, start and end of the I/O.
+    - file and host are indexes in file_ids and hostnames (the ids and hostnames found in the darshan file)
+    - op is the index of the operation in OPS
+    - record is the index of the DXT record (one per (file, rank)) in the record columns
+"""
+
+OPS = ("read", "write")
+SEGMENT_COLUMNS = (
+    "rank",
+    "file",
+    "host",
+    "op",
+    "record",
+    "offset",
+    "length",
+    "start",
+    "end",
+)
+RECORD_COLUMNS = {
+    "id": np.uint64,
+    "rank": np.int64,
+    "file": np.int32,
+    "host": np.int32,
+    "read_count": np.int64,
+    "write_count": np.int64,
+}
+
+
+class SegmentTable:
+    def __init__(self, segments, records, file_ids, hostnames):
+        self.rank = segments["rank"]
+        self.file = segments["file"]
+        self.host = segments["host"]
+        self.op = segments["op"]
+        self.record = segments["record"]
+        self.offset = segments["offset"]
+        self.length = segments["length"]
+        self.start = segments["start"]
+        self.end = segments["end"]
+
+        self.record_id = records["id"]
+        self.record_rank = records["rank"]
+        self.record_file = records["file"]
+        self.record_host = records["host"]
+        self.read_count = records["read_count"]
+        self.write_count = records["write_count"]
+
+        self.file_ids = file_ids
+        self.hostnames = hostnames
+        # codes of file_ids and hostnames among all the darshan files, see DarshanInfo.index_segments
+        self.file_codes = None
+        self.host_codes = None
+        # the segments sorted by start time, see window
+        self.start_order = None
+
+    @classmethod
+    def from_dxt_records(cls, dxt_records):
+        file_index = dict()
+        host_index = dict()
+        records = {k: list() for k in RECORD_COLUMNS}
+        sizes = list()
+        times = list()
+        nseg = list()
+        for e in dxt_records:
+            records["id"].append(e["id"])
+            records["rank"].append(e["rank"])
+            records["file"].append(file_index.setdefault(e["id"], len(file_index)))
+            records["host"].append(
+                host_index.setdefault(e["hostname"], len(host_index))
+            )
+            records["read_count"].append(e["read_count"])
+            records["write_count"].append(e["write_count"])
+            for op_segment in ("read_segments", "write_segments"):
+                segments = e[op_segment]
+                sizes += [(s["offset"], s["length"]) for s in segments]
+                times += [(s["start_time"], s["end_time"]) for s in segments]
+                nseg.append(len(segments))
+
+        records = {k: np.array(v, dtype=RECORD_COLUMNS[k]) for k, v in records.items()}
+        sizes = np.array(sizes, dtype=np.int64).reshape(-1, 2)
+        times = np.array(times, dtype=np.float64).reshape(-1, 2)
+        nseg = np.array(nseg, dtype=np.int64)
+        record = np.repeat(np.arange(len(nseg)) // 2, nseg)
+        segments = {
+            "rank": records["rank"][record],
+            "file": records["file"][record],
+            "host": records["host"][record],
+            "op": np.repeat(np.arange(len(nseg)) % 2, nseg).astype(np.int8),
+            "record": record.astype(np.int32),
+            "offset": sizes[:, 0].copy(),
+            "length": sizes[:, 1].copy(),
+            "start": times[:, 0].copy(),
+            "end": times[:, 1].copy(),
+        }
+        file_ids = np.array(list(file_index), dtype=np.uint64)
+        return cls(segments, records, file_ids, list(host_index))
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        segments = {k: arrays["segments_" + k] for k in SEGMENT_COLUMNS}
+        records = {k: arrays["records_" + k] for k in RECORD_COLUMNS}
+        return cls(segments, records, arrays["file_ids"], arrays["hostnames"].tolist())
+
+    def to_arrays(self):
+        """
+        Returns all the columns in a flat dictionary of arrays (e.g. for numpy.savez), see from_arrays
+        """
+        arrays = {"segments_" + k: v for k, v in self.segments().items()}
+        arrays.update({"records_" + k: v for k, v in self.records().items()})
+        arrays["file_ids"] = self.file_ids
+        arrays["hostnames"] = np.array(self.hostnames, dtype=str)
+        return arrays
+
+    def segments(self):
+        return {k: getattr(self, k) for k in SEGMENT_COLUMNS}
+
+    def records(self):
+        return {
+            "id": self.record_id,
+            "rank": self.record_rank,
+            "file": self.record_file,
+            "host": self.record_host,
+            "read_count": self.read_count,
+            "write_count": self.write_count,
+        }
+
+    def take_records(self, mask):
+        """
+        Returns a new table with the records selected by mask (a boolean array over the records) and their segments
+        """
+        index = np.cumsum(mask) - 1
+        selected = mask[self.record]
+        segments = {k: v[selected] for k, v in self.segments().items()}
+        segments["record"] = index[segments["record"]].astype(np.int32)
+        records = {k: v[mask] for k, v in self.records().items()}
+        table = SegmentTable(segments, records, self.file_ids, self.hostnames)
+        table.file_codes = self.file_codes
+        table.host_codes = self.host_codes
+        return table
+
+    def window(self, tstart, tend):
+        """
+        Returns a table of the segments that overlap [tstart, tend), their start and end are relative to tstart.
+        The segments are found by binary search in the segments sorted by start time, this index is built once per table :
+        a segment that overlaps the window starts before tend, and after tstart minus the longest duration of a segment.
+        """
+        if self.start_order is None:
+            self.start_order = np.argsort(self.start, kind="stable")
+            self.sorted_start = self.start[self.start_order]
+            self.max_duration = np.max(self.end - self.start, initial=0)
+
+        first = np.searchsorted(self.sorted_start, tstart - self.max_duration)
+        last = np.searchsorted(self.sorted_start, tend)
+        index = self.start_order[first:last]
+        # the segments keep their order in the table
+        index = np.sort(index[self.end[index] >= tstart])
+
+        segments = {k: v[index] for k, v in self.segments().items()}
+        segments["start"] = segments["start"] - tstart
+        segments["end"] = segments["end"] - tstart
+        table = SegmentTable(segments, self.records(), self.file_ids, self.hostnames)
+        table.file_codes = self.file_codes
+        table.host_codes = self.host_codes
+        return table
+
+    def split_ranks(self, n):
+        """
+        Splits the table in (at most) n tables of contiguous ranges of ranks, a record is never split
+        """
+        ranks = np.unique(self.record_rank)
+        if n <= 1 or len(ranks) <= 1:
+            return [self]
+        return [
+            self.take_records(np.isin(self.record_rank, group))
+            for group in np.array_split(ranks, min(n, len(ranks)))
+        ]
+
+    def __len__(self):
+        return len(self.start)
+
+    def nb_records(self):
+        return len(self.record_id)
+
+    def op_mask(self, op):
+        return self.op == OPS.index(op)
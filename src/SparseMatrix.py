@@ -1,28 +1,227 @@
+import json
+import numpy as np
 import scipy.sparse as sp
 
+from MatrixData import DOWNSAMPLING
+
 """
 This class is a sub-class that creates Sparse Matrices from 3 array in a coo_format then plotted it as heatmaps.
 """
 
+# the totals by which the rows are ranked with -top (see RW_SparseMatrix.select_rows)
+TOP_BY = ("bytes", "count", "meta")
+# the maximum number of rows of the images written by write_raster
+RASTER_HEIGHT = 1024
+
 
 class SparseMatrix:
     def __init__(self, info, v, x, y, shape, dtype="float64"):
         self.mat = sp.coo_matrix((v, (x, y)), shape=shape, dtype=dtype)
         self.mat.sum_duplicates()
         self.vmax = self.mat.data.max() if len(self.mat.data) != 0 else 0
-        self.extent = [0, info.duration, 0, shape[0]]
+        self.extent = [info.tstart, info.tend, 0, shape[0]]
         self.norm = info.norm
+        self.downsample = info.downsample
+        self.cmap = info.cmap
+        # first row of each row of the plotted image, it is set by plot_heatmap if the rows are downsampled
+        self.row_groups = None
 
     def plot_heatmap(self, ax, title):
+        array, self.row_groups = downsample_rows(
+            self.mat, pixel_height(ax), self.downsample
+        )
+        vmax = self.vmax if self.row_groups is None else array.max(initial=0)
         ax.imshow(
-            self.mat.toarray(),
+            array,
             aspect="auto",
-            cmap="Reds",
+            cmap=self.cmap,
             interpolation="nearest",
             origin="lower",
             extent=self.extent,
             norm=self.norm,
-            vmax=self.vmax,
+            vmax=vmax,
         )
         ax.set_title(title)
         ax.grid(True)
+
+    def to_raster(self, filename, title):
+        self.row_groups = write_raster(
+            self.mat,
+            filename,
+            title,
+            self.extent,
+            self.norm,
+            self.vmax,
+            self.downsample,
+            self.cmap,
+        )
+        return
+
+
+def pixel_height(ax):
+    """
+    Returns the height of the axes in pixels of the saved figure
+    """
+    return max(int(np.ceil(ax.bbox.height)), 1)
+
+
+def downsample_rows(mat, height, method="sum"):
+    """
+    Returns (array, row_groups) : the dense array of a sparse matrix whose rows are aggregated (sum, max or mean)
+    by groups of contiguous rows, so that it has at most height rows (i.e. one row per pixel of the image),
+    and the first row of each group (row_groups is None if the matrix is not downsampled).
+    Only the downsampled array is dense, so its size depends on the size of the image and not on the number of rows.
+    """
+    if method not in DOWNSAMPLING:
+        print("Wrong downsampling method : {}".format(method))
+        exit(1)
+
+    nrows, ncols = mat.shape
+    if method == "none" or nrows <= height:
+        return mat.toarray(), None
+
+    group = np.arange(nrows, dtype=np.int64) * height // nrows
+    row_groups = np.searchsorted(group, np.arange(height))
+
+    mat = mat.tocoo()
+    array = np.zeros((height, ncols), dtype=np.result_type(mat.dtype, np.float64))
+    if method == "max":
+        np.maximum.at(array, (group[mat.row], mat.col), mat.data)
+    else:
+        np.add.at(array, (group[mat.row], mat.col), mat.data)
+    if method == "mean":
+        array /= np.bincount(group, minlength=height)[:, None]
+    return array, row_groups
+
+
+def log_downsample(info, nrows, row_groups):
+    """
+    Prints with info.log (i.e. with verbose options) how the nrows rows of a heatmap are downsampled to row_groups (see downsample_rows),
+    it is called once per figure and not by downsample_rows, that is called for each heatmap of the figure
+    """
+    if row_groups is None:
+        return
+    height = len(row_groups)
+    info.log(
+        "Downsample {} rows to {} rows (groups of {} to {} rows, {})".format(
+            nrows, height, nrows // height, -(-nrows // height), info.downsample
+        )
+    )
+    return
+
+
+def top_rows(x, weights, nrows, k):
+    """
+    Returns the k rows with the largest totals (the sums of the weights of the entries of each row, x is the row of each entry),
+    by decreasing totals. The k rows are found with a partial selection (argpartition) of the totals instead of a sort of all the rows,
+    only the k rows are sorted. Returns None if the matrix has no more than k rows
+    """
+    if k >= nrows:
+        return None
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    totals = np.bincount(x, weights=weights, minlength=nrows)
+    kth = totals[np.argpartition(-totals, k - 1)[k - 1]]
+    # (the rows with the same total as the k-th row are taken by row, so that the selection doesn't depend on argpartition)
+    above = np.flatnonzero(totals > kth)
+    top = np.concatenate((above, np.flatnonzero(totals == kth)[: k - len(above)]))
+    return top[np.lexsort((top, -totals[top]))]
+
+
+def select_entries(x, rows, nrows, other=False):
+    """
+    Returns (the new row of the kept entries, the mask of the kept entries) : the entries of the rows are moved to the position
+    of their row in rows, and the entries of the other rows are dropped, or moved to a last row (len(rows)) with other
+    """
+    position = np.full(nrows, len(rows) if other else -1, dtype=np.int64)
+    position[rows] = np.arange(len(rows))
+    new_x = position[x]
+    keep = new_x >= 0
+    return new_x[keep], keep
+
+
+def normalize(array, norm, vmax):
+    """
+    Returns (values between 0 and 1, vmin) : array scaled by the norm (linear, log or symlog) as matplotlib.pyplot.imshow does it,
+    the values that can't be scaled (0 or less with log) are masked
+    """
+    array = np.ma.masked_invalid(array)
+    if norm == "linear":
+        vmin = array.min() if array.count() != 0 else 0
+        scaled = (array - vmin) / (vmax - vmin) if vmax > vmin else array * 0
+    elif norm == "log":
+        array = np.ma.masked_less_equal(array, 0)
+        vmin = array.min() if array.count() != 0 else vmax
+        if vmax > vmin:
+            scaled = np.ma.log(array / vmin) / np.log(vmax / vmin)
+        else:
+            scaled = array * 0
+    elif norm == "symlog":
+        vmin = array.min() if array.count() != 0 else 0
+
+        # the symmetrical log scale of matplotlib (linthresh=2, linscale=1, base=10)
+        def symlog(v, linthresh=2, linscale=1 / (1 - 1 / 10)):
+            v = np.ma.asarray(v, dtype=np.float64)
+            large = np.abs(v) > linthresh
+            return np.ma.where(
+                large,
+                np.sign(v)
+                * linthresh
+                * (
+                    linscale + np.ma.log10(np.ma.where(large, np.abs(v), 1) / linthresh)
+                ),
+                v * linscale,
+            )
+
+        if vmax > vmin:
+            scaled = (symlog(array) - symlog(vmin)) / (symlog(vmax) - symlog(vmin))
+        else:
+            scaled = array * 0
+    else:
+        print("Wrong norm for a raster : {}".format(norm))
+        exit(1)
+    return np.ma.clip(scaled, 0, 1), vmin
+
+
+def write_raster(mat, filename, title, extent, norm, vmax, downsample, cmap="Reds"):
+    """
+    Writes the heatmap of a sparse matrix as a PNG (one pixel per time bin and per row, or group of rows),
+    the values are mapped through the norm and the colormap with numpy, without any figure.
+    The extent, vmin, vmax and norm of the image are written in a sidecar JSON (filename.json).
+    A matrix without rows (e.g. no DXT_POSIX records, or -top 0) has no image, only the sidecar is written (its image is null).
+    Returns the row groups (see downsample_rows)
+    """
+    image, row_groups, vmin = None, None, 0
+    if mat.shape[0] != 0:
+        import matplotlib
+        from PIL import Image
+
+        array, row_groups = downsample_rows(
+            mat, min(mat.shape[0], RASTER_HEIGHT), downsample
+        )
+        if row_groups is not None or vmax is None:
+            vmax = array.max(initial=0)
+        scaled, vmin = normalize(array, norm, vmax)
+        rgba = matplotlib.colormaps[cmap](scaled, bytes=True)
+        # the first row is at the bottom, as with origin="lower"
+        # (PIL writes the image without importing the figures of matplotlib, as matplotlib.image.imsave does)
+        image = filename + ".png"
+        Image.fromarray(np.ascontiguousarray(rgba[::-1])).save(image)
+
+    with open(filename + ".json", "w") as sidecar:
+        json.dump(
+            {
+                "image": image,
+                "title": title,
+                "extent": [float(e) for e in extent],
+                "shape": list(mat.shape),
+                "norm": norm,
+                "vmin": float(vmin),
+                "vmax": float(vmax or 0),
+                "cmap": cmap,
+                "row_groups": None if row_groups is None else row_groups.tolist(),
+            },
+            sidecar,
+            indent=4,
+        )
+    return row_groups
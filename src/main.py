@@ -1,13 +1,16 @@
+import os
 import sys
-import time
-
-from DarshanInfo import DarshanInfo
 
+from Profiler import profiler
 
 """
 This is the main file that is used to run the different functions of DarshanInfo.
+The modules of the features are imported only when they are run, so that the usage and the features that do not plot start fast.
 """
 
+# the figures are only saved, matplotlib uses a backend without display (unless MPLBACKEND is set)
+os.environ.setdefault("MPLBACKEND", "Agg")
+
 
 def usage():
     print("Usage: python darshan-info.py <Darshan file or repository> [Options]")
@@ -18,6 +21,12 @@ def usage():
         "nb_rank_file : Shows the number of rank that access the same file each time step"
     )
     print("metadata : Shows the metadata of the application that are not I/O related")
+    print(
+        "concurrency : Shows the number of ranks, files and ranks per host that do I/O at the same time"
+    )
+    print(
+        "Usage: python darshan-info.py replot <.npz files or repository> [Options] : plots again the data saved with -save-data"
+    )
     print("To see the options, check the comment of each python file.")
 
     return
@@ -29,53 +38,68 @@ def main():
         usage()
         return
 
+    if argv[1] == "replot":
+        from Replot import Replot
+
+        # (the options are parsed before the span, -profile enables the profiler)
+        replot = Replot(argv[2:])
+        with profiler.span("replot", "replot"):
+            replot.plot_all()
+        profiler.close()
+        return
+
+    from DarshanInfo import DarshanInfo
+
     info = DarshanInfo(argv)
+    argv = info.argv
 
     info.i = 2
     if len(argv) == 2:
-        start_t = time.time()
-        info.dxt_posix_heatmap()
-        print("dxt_posix_heatmap took %.3f seconds" % (time.time() - start_t))
+        with profiler.span("dxt_posix_heatmap", "dxt_posix_heatmap"):
+            info.dxt_posix_heatmap()
 
-        start_t = time.time()
-        info.nb_rank_file()
-        print("nb_rank_file took %.3f seconds" % (time.time() - start_t))
+        with profiler.span("nb_rank_file", "nb_rank_file"):
+            info.nb_rank_file()
 
-        start_t = time.time()
-        info.metadata_without_IO()
-        print("metadata took %.3f seconds" % (time.time() - start_t))
+        with profiler.span("metadata_without_IO", "metadata_without_IO"):
+            info.metadata_without_IO()
+        info.close()
         return
 
     while info.i < len(argv):
         if argv[info.i] == "dxt_posix":
-            start_t = time.time()
-            info.dxt_posix_heatmap()
-            print("dx_posix_heatmap took %.3f seconds" % (time.time() - start_t))
+            with profiler.span("dxt_posix_heatmap", "dxt_posix_heatmap"):
+                info.dxt_posix_heatmap()
             continue
 
         if argv[info.i] == "nb_rank_file":
-            start_t = time.time()
-            info.nb_rank_file()
-            print("nb_rank_file took %.3f seconds" % (time.time() - start_t))
+            with profiler.span("nb_rank_file", "nb_rank_file"):
+                info.nb_rank_file()
             continue
 
         if argv[info.i] == "metadata":
-            start_t = time.time()
-            info.metadata_without_IO()
-            print("metadata took %.3f seconds" % (time.time() - start_t))
+            with profiler.span("metadata_without_IO", "metadata_without_IO"):
+                info.metadata_without_IO()
             continue
 
         if argv[info.i] == "aggregate_info":
-            start_t = time.time()
-            info.aggregate_info()
-            print("aggregate_info took %.3f seconds" % (time.time() - start_t))
+            with profiler.span("aggregate_info", "aggregate_info"):
+                info.aggregate_info()
+            continue
+
+        if argv[info.i] == "concurrency":
+            with profiler.span("concurrency", "concurrency"):
+                info.concurrency_info()
             continue
 
         else:
             print("Option {} is not recognized".format(argv[info.i]))
             usage()
+            info.close()
             return
 
+    info.close()
+
 
 if __name__ == "__main__":
     main()
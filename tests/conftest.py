@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+# the synthetic darshan files (see benchmarks/synthetic.py)
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+
+
+@pytest.fixture
+def synthetic_files():
+    """
+    Returns a function that makes n synthetic darshan files (synthetic_{seed}.darshan) of the seeds seed, seed + 1, ...
+    with the options of SyntheticReport, the files can be read by several features and several DarshanInfo
+    """
+    from synthetic import synthetic_file
+
+    def make(n=1, seed=0, **options):
+        return [
+            synthetic_file("synthetic_{}.darshan".format(i), seed=i, **options)
+            for i in range(seed, seed + n)
+        ]
+
+    return make
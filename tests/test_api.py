@@ -0,0 +1,65 @@
+import os
+
+import numpy as np
+import pytest
+
+import DarshanAPI
+
+
+def test_api_without_files(tmp_path, monkeypatch, capsys, synthetic_files):
+    monkeypatch.chdir(tmp_path)
+    (f,) = synthetic_files(nprocs=16, nfiles=4, nhosts=2, segments=20)
+    options = DarshanAPI.Options(nbins=20, ops=["write"], verbose=False)
+    logs = DarshanAPI.load(f.path, options, files=[f])
+
+    binned = DarshanAPI.bin_io(logs, options)
+    assert set(binned) == {("write", "rank"), ("write", "file"), ("write", "hostname")}
+    table = f.segments
+    written = table.length[table.op_mask("write")].sum()
+    for b in binned.values():
+        assert b.data["bw"].shape[0] == len(b.labels)
+        assert len(b.times) == b.data["bw"].shape[1]
+        assert np.isclose(b.data["bw"].sum(), written)
+
+    (write,) = DarshanAPI.aggregate(logs, options).values()
+    assert np.isclose(write.data["bw"].sum(), written)
+
+    (ranks,) = DarshanAPI.ranks_per_file(logs, options).values()
+    assert ranks.data["ranks"].shape == (len(ranks.labels), len(ranks.times))
+    # each (file, rank) that writes is counted in at least one bin, and a file has at most its ranks in a bin
+    mask = table.op_mask("write")
+    pairs = set(zip(table.file[mask].tolist(), table.rank[mask].tolist()))
+    assert ranks.data["ranks"].sum() >= len(pairs)
+    assert ranks.data["ranks"].max() <= f.nprocs
+    assert os.listdir(tmp_path) == []
+    # the progress is not printed without verbose
+    assert capsys.readouterr().out == ""
+
+
+def test_load_twice(synthetic_files):
+    (f,) = synthetic_files(nprocs=16, nfiles=4, nhosts=2, segments=20)
+    (g,) = synthetic_files(seed=1, nprocs=8, nfiles=4, nhosts=2)
+    options = DarshanAPI.Options(nbins=20, verbose=False)
+    # the same files are read by two DarshanInfo, the second one has its own codes of the file ids and hostnames
+    first = DarshanAPI.bin_io(DarshanAPI.load(f.path, options, files=[f, g]), options)
+    second = DarshanAPI.bin_io(DarshanAPI.load(g.path, options, files=[g, f]), options)
+    again = DarshanAPI.bin_io(DarshanAPI.load(f.path, options, files=[f, g]), options)
+    for k, binned in first.items():
+        assert np.array_equal(binned.labels, again[k].labels)
+        assert sorted(binned.labels.tolist()) == sorted(second[k].labels.tolist())
+        for name, data in binned.data.items():
+            assert np.allclose(data.toarray(), again[k].data[name].toarray())
+            assert np.isclose(data.sum(), second[k].data[name].sum())
+
+
+def test_time_window(synthetic_files):
+    (f,) = synthetic_files(nprocs=8, segments=20)
+    logs = DarshanAPI.load(f.path, files=[f])
+    # tend is clipped to the duration
+    options = DarshanAPI.Options(tstart=10.0, tend=1e12, verbose=False)
+    write = DarshanAPI.aggregate(logs, options)["write"]
+    assert logs.tend == logs.duration
+    assert write.times[0] == 10.0 and len(write.data["bw"]) == options.nbins
+    for tstart, tend in ((1e12, None), (-1.0, None), (20.0, 10.0)):
+        with pytest.raises(SystemExit):
+            DarshanAPI.bin_io(logs, DarshanAPI.Options(tstart=tstart, tend=tend))
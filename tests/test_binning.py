@@ -0,0 +1,49 @@
+import numpy as np
+
+from Binning import bin_segments, bin_contributions
+
+
+def loop_bins(start, end, step, nbins, span=False):
+    # per-segment reference, as the features used to do it
+    seg, bins = [], []
+    for i in range(len(start)):
+        idx_beg = int(start[i] // step)
+        if span:
+            length = int(end[i] // step) - idx_beg + 1
+        else:
+            length = int((end[i] - start[i]) // step + 1)
+        if idx_beg + length > nbins:
+            length = nbins - idx_beg
+        for it in range(length):
+            seg.append(i)
+            bins.append(idx_beg + it)
+    return seg, bins
+
+
+def test_bin_segments():
+    rng = np.random.default_rng(0)
+    start = rng.uniform(0, 10.5, 1000)
+    end = start + rng.exponential(0.5, 1000)
+    for span in (False, True):
+        seg, bins, length = bin_segments(start, end, 10 / 40, 40, span)
+        ref_seg, ref_bins = loop_bins(start, end, 10 / 40, 40, span)
+        assert seg.tolist() == ref_seg
+        assert bins.tolist() == ref_bins
+        assert np.bincount(seg, minlength=1000).tolist() == length.tolist()
+
+
+def test_bin_contributions():
+    seg, bins, v_bw, v_meta = bin_contributions(
+        [0.0, 0.5], [2.5, 0.6], [30, 8], [3.0, 1.0], 1.0, 10
+    )
+    assert bins.tolist() == [0, 1, 2, 0]
+    assert v_bw.tolist() == [10, 10, 10, 8]
+    assert v_meta.tolist() == [1, 1, 1, 1]
+
+
+def test_bin_segments_clip(capsys):
+    # the second segment ends after the last bin, it is cut
+    for clip in (False, True):
+        seg, bins, length = bin_segments([0.5, 8.5], [1.5, 12.0], 1.0, 10, clip=clip)
+        assert length.tolist() == [2, 2]
+        assert ("Warning" in capsys.readouterr().out) != clip
@@ -0,0 +1,57 @@
+import os
+import types
+
+import numpy as np
+
+from synthetic import SyntheticReport
+from DarshanCache import DarshanCache
+from DarshanFile import DarshanFile
+
+
+def darshan_file(path, cache, seed=0):
+    # the records are the ones of a synthetic report, the darshan file only gives the key of the entry
+    with open(path, "w") as log:
+        log.write("log {}".format(seed))
+    report = SyntheticReport(nprocs=8, nfiles=2, segments=10, seed=seed)
+    return DarshanFile(path, cache, report=report, verbose=False)
+
+
+def test_store_load_evict(tmp_path, monkeypatch):
+    cache = DarshanCache(str(tmp_path / "cache"))
+    stored = list()
+    store = cache.store
+    monkeypatch.setattr(cache, "store", lambda f: stored.append(f) or store(f))
+
+    path = str(tmp_path / "a.darshan")
+    f = darshan_file(path, cache)
+    f.get_dxt_posix()
+    f.get_posix()
+    f.store()
+    f.store()
+    # the entry is written once for the DXT_POSIX and POSIX records
+    assert stored == [f]
+
+    # the report is not opened, the records are loaded from the entry
+    g = DarshanFile(path, cache, verbose=False)
+    assert g.report is None and g.nprocs == f.nprocs and g.modules == f.modules
+    for k, column in f.segments.to_arrays().items():
+        assert np.array_equal(column, g.segments.to_arrays()[k]), k
+    for name in ("counters", "fcounters"):
+        assert f.posix[name].equals(g.posix[name])
+
+    # the same size and modification time with another content is another entry
+    stat = os.stat(path)
+    with open(path, "w") as log:
+        log.write("log 9")
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert not cache.load(types.SimpleNamespace(path=path))
+
+    # the least recently used entries are removed when the cache is too big
+    # (the entry of other is smaller, it has no POSIX records)
+    entries = os.listdir(cache.directory)
+    cache.max_size = os.path.getsize(os.path.join(cache.directory, entries[0])) + 1
+    os.utime(os.path.join(cache.directory, entries[0]), (0, 0))
+    other = darshan_file(str(tmp_path / "b.darshan"), cache, seed=1)
+    other.get_dxt_posix()
+    other.store()
+    assert os.listdir(cache.directory) == [other.cache_key + ".npz"]
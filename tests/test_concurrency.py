@@ -0,0 +1,26 @@
+import numpy as np
+
+from Concurrency import busy_intervals, sweep
+
+
+def test_sweep():
+    rng = np.random.default_rng(0)
+    n = 500
+    # the times are multiples of 1/4 of a bin, so the concurrency is constant on each quarter of a bin
+    start = rng.integers(0, 160, size=n) / 4
+    end = start + rng.integers(0, 12, size=n) / 4
+    group = rng.integers(0, 3, size=n)
+    key = rng.integers(0, 20, size=n)
+
+    g, k, s, e = busy_intervals(group, key, start, end)
+    maximum, mean = sweep(g, s, e, 3, 1.0, 40)
+    assert maximum.shape == mean.shape == (3, 40)
+
+    middle = (np.arange(160) + 0.5) / 4
+    for i in range(3):
+        busy = [
+            len(np.unique(key[(group == i) & (start <= t) & (t < end)])) for t in middle
+        ]
+        busy = np.reshape(busy, (40, 4))
+        assert np.array_equal(maximum[i], busy.max(axis=1))
+        assert np.allclose(mean[i], busy.mean(axis=1))
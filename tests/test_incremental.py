@@ -0,0 +1,55 @@
+import datetime
+import os
+
+import numpy as np
+
+from IncrementalState import IncrementalState
+
+
+class Log:
+    def __init__(self, path, nprocs, hours):
+        self.path = path
+        self.nprocs = nprocs
+        self.start_time = datetime.datetime(2024, 1, 1, hours)
+        self.end_time = self.start_time + datetime.timedelta(minutes=30)
+        with open(path, "w") as log:
+            log.write(path)
+
+
+def test_remove_log(tmp_path):
+    logs = [Log(str(tmp_path / "{}.darshan".format(i)), 4 + i, i) for i in range(3)]
+    state = IncrementalState(str(tmp_path / "state"))
+    for log in logs:
+        state.add_log(log)
+        state.time_axis("dxt_posix", 3 * 3600, 10)
+        np.savez(state.prefix("dxt_posix", log.path) + "_write_rank.npz", v=np.ones(1))
+        state.set_processed("dxt_posix", log.path)
+    state.save()
+    assert len(state.partials("dxt_posix", "write_rank")) == 3
+    assert state.off_axis("dxt_posix") == list()
+
+    # when the time range grows the step is doubled, the partial data are not on the time axis anymore
+    longer = IncrementalState(str(tmp_path / "state"))
+    longer.time_axis("dxt_posix", 6 * 3600, 10)
+    assert longer.off_axis("dxt_posix") == sorted(
+        os.path.abspath(log.path) for log in logs
+    )
+    assert longer.partials("dxt_posix", "write_rank") == list()
+
+    os.remove(logs[0].path)
+    state = IncrementalState(str(tmp_path / "state"))
+    removed = state.remove_missing([log.path for log in logs[1:]])
+    assert removed == [os.path.abspath(logs[0].path)]
+    for log in logs[1:]:
+        state.add_log(log)
+    # the ranks of the removed log are not counted, and the other logs are processed again
+    assert state.manifest["nprocs"] == 5 + 6
+    assert [log.rank_offset for log in logs[1:]] == [0, 5]
+    assert state.manifest["start"] == logs[1].start_time.timestamp()
+    assert state.partials("dxt_posix", "write_rank") == list()
+    assert state.is_stale("dxt_posix", logs[1].path, ["write_rank"])
+    assert not os.path.exists(
+        state.prefix("dxt_posix", logs[0].path) + "_write_rank.npz"
+    )
+
+    assert state.remove_missing([log.path for log in logs[1:]]) == list()
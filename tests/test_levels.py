@@ -0,0 +1,27 @@
+import numpy as np
+
+import DarshanAPI
+
+
+def binned_levels(files, levels):
+    options = DarshanAPI.Options(nbins=max(levels), ops=["write"], verbose=False)
+    logs = DarshanAPI.load(files[0].path, options, files=files)
+    logs.set_feature_options(options, levels)
+    matrices = logs.bin_io() + logs.aggregate()
+    return {(m.data_name(), m.factor): m for m in matrices}
+
+
+def test_levels_are_binned_from_the_segments(synthetic_files):
+    files = synthetic_files(3, nprocs=8, segments=50)
+    coarse = binned_levels(files, [50, 1000])
+    plain = binned_levels(files, [50])
+    assert len(coarse) == 2 * len(plain)
+    for (name, factor), m in plain.items():
+        level = coarse[name + "_x20", 20]
+        if hasattr(m, "mat_bw"):
+            for k in ("mat", "mat_bw", "mat_bw_count", "mat_meta"):
+                a, b = getattr(m, k).mat.toarray(), getattr(level, k).mat.toarray()
+                assert np.allclose(a, b), (name, k)
+        else:
+            for k in ("v", "v_bw", "v_meta"):
+                assert np.allclose(getattr(m, k), getattr(level, k)), (name, k)
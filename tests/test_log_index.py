@@ -0,0 +1,56 @@
+import os
+
+import LogIndex as log_index
+from LogIndex import LogIndex
+
+
+def fake_header(path):
+    job_id = int(os.path.basename(path).split(".")[0])
+    job = {
+        "jobid": job_id,
+        "uid": 0,
+        "nprocs": 4,
+        "start_time_sec": 1000 * job_id,
+        "end_time_sec": 1000 * job_id + 500,
+        "log_ver": "3.41",
+    }
+    modules = {"POSIX": {"len": 10, "ver": 4, "partial_flag": False}}
+    if job_id % 2 == 0:
+        modules["DXT_POSIX"] = {"len": 100, "ver": 1, "partial_flag": False}
+    return job, modules, 3
+
+
+def test_scan_and_select(tmp_path, monkeypatch):
+    read = list()
+    monkeypatch.setattr(
+        log_index, "read_header", lambda path: read.append(path) or fake_header(path)
+    )
+    paths = [str(tmp_path / "{}.darshan".format(job_id)) for job_id in range(1, 5)]
+    for path in paths:
+        with open(path, "w") as f:
+            f.write("log")
+
+    index = LogIndex(str(tmp_path / "index.sqlite"))
+    assert index.scan(paths) == 4
+    assert index.select(paths, modules=["DXT_POSIX"]) == [paths[1], paths[3]]
+    assert index.select(paths, job_ids=[1, 3]) == [paths[0], paths[2]]
+    # the darshan files that run during [2400, 3100]
+    assert index.select(paths, since=2400, until=3100) == [paths[1], paths[2]]
+    assert index.header(paths[1])["modules"] == ["POSIX", "DXT_POSIX"]
+    index.close()
+
+    # only the changed darshan files are read again, the removed ones are forgotten
+    with open(paths[0], "w") as f:
+        f.write("a longer log")
+    os.remove(paths[3])
+    read.clear()
+    index = LogIndex(str(tmp_path / "index.sqlite"))
+    assert index.scan(paths[:3]) == 1
+    assert read == [paths[0]]
+    assert index.select(paths, modules=["DXT_POSIX"]) == [paths[1]]
+
+    # a scan of one darshan file keeps the other darshan files of its directory
+    read.clear()
+    assert index.scan(paths[1:2]) == 0
+    assert index.scan(paths[:3]) == 0
+    assert read == list()
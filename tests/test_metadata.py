@@ -0,0 +1,58 @@
+import os
+
+import pandas as pd
+
+from MetadataWithout_IO import MetadataWithout_IO
+
+
+class File:
+    def __init__(self, posix, rank_offset):
+        self.posix = posix
+        self.rank_offset = rank_offset
+
+    def get_posix_merged(self):
+        return self.posix
+
+
+class Info:
+    pass
+
+
+def test_first_nonzero_counter(tmp_path):
+    posix = pd.DataFrame(
+        {
+            "id": [1, 2, 3, 4, 5],
+            "rank": [0, 1, -1, 0, 1],
+            "POSIX_OPENS": [1, 0, 2, 0, 0],
+            "POSIX_READS": [0, 0, 0, 0, 3],
+            "POSIX_WRITES": [0, 0, 0, 0, 0],
+            "POSIX_STATS": [1, 4, 0, 0, 0],
+            "POSIX_F_META_TIME": [0.5, 0.25, 0.0, 1.0, 0.0],
+        }
+    )
+    info = Info()
+    info.files = [File(posix, 0), File(posix, 2)]
+    info.jobs = 1
+    info.output = str(tmp_path / "m")
+    MetadataWithout_IO(info).get_info(info)
+
+    # the records with a read are not metadata, the ones without counter are not grouped
+    assert sorted(os.listdir(tmp_path)) == [
+        "m_meta_posix_POSIX_OPENS.csv",
+        "m_meta_posix_POSIX_STATS.csv",
+    ]
+    opens = pd.read_csv(tmp_path / "m_meta_posix_POSIX_OPENS.csv", index_col=0)
+    assert list(opens.columns) == [
+        "id",
+        "rank",
+        "POSIX_OPENS",
+        "POSIX_STATS",
+        "POSIX_F_META_TIME",
+    ]
+    assert opens.loc["count", "id"] == 4
+    assert opens.loc["sum", "POSIX_OPENS"] == 6
+    # the ranks of the second file are after the ranks of the first one, except the shared records (-1)
+    assert opens.loc["sum", "rank"] == 0 - 1 + 2 - 1
+    stats = pd.read_csv(tmp_path / "m_meta_posix_POSIX_STATS.csv", index_col=0)
+    assert list(stats.columns) == ["id", "rank", "POSIX_STATS", "POSIX_F_META_TIME"]
+    assert stats.loc["sum", "rank"] == 1 + 3
@@ -0,0 +1,30 @@
+import numpy as np
+
+import DarshanAPI
+
+
+def binned_features(files, jobs):
+    options = DarshanAPI.Options(jobs=jobs, verbose=False)
+    logs = DarshanAPI.load(files[0].path, options, files=files)
+    return [
+        DarshanAPI.bin_io(logs, options),
+        DarshanAPI.aggregate(logs, options),
+        DarshanAPI.ranks_per_file(logs, options),
+        DarshanAPI.concurrency(logs, options),
+    ]
+
+
+def test_parallel_binning(synthetic_files):
+    files = synthetic_files(12, nprocs=8, segments=20)
+    expected = binned_features(files, 1)
+    written = sum(f.segments.length[f.segments.op_mask("write")].sum() for f in files)
+    assert np.isclose(expected[1]["write"].data["bw"].sum(), written)
+    for jobs in (2, 4, 16):
+        features = binned_features(files, jobs)
+        for one, many in zip(expected, features):
+            for k, binned in one.items():
+                for name, data in binned.data.items():
+                    other = many[k].data[name]
+                    if hasattr(data, "toarray"):
+                        data, other = data.toarray(), other.toarray()
+                    assert np.allclose(data, other), (jobs, k, name)
@@ -0,0 +1,33 @@
+from Profiler import Profiler
+
+
+def test_nested_spans(tmp_path):
+    profiler = Profiler()
+    profiler.enable(str(tmp_path / "profile"))
+    with profiler.span("feature"):
+        with profiler.span("bin", file="a.darshan"):
+            profiler.count("segments", 10)
+            profiler.count("segments", 5)
+        # the spans of a worker become children of the current span
+        worker = Profiler()
+        worker.start_worker(True)
+        with worker.span("bin shard"):
+            pass
+        profiler.add_events(worker.drain())
+
+    report = profiler.report()
+    (feature,) = report["spans"]
+    assert [child["name"] for child in feature["children"]] == ["bin", "bin shard"]
+    assert feature["children"][0]["counters"]["segments"]["count"] == 15
+    assert feature["children"][0]["args"] == {"file": "a.darshan"}
+    assert report["stages"]["bin"]["calls"] == 1
+    assert feature["peak_rss_mb"] >= feature["children"][0]["peak_rss_mb"] > 0
+
+    trace = profiler.trace()["traceEvents"]
+    spans = [event for event in trace if event["ph"] == "X"]
+    assert {event["name"] for event in spans} == {"feature", "bin", "bin shard"}
+    assert all(event["dur"] >= 0 for event in spans)
+
+    profiler.close()
+    assert (tmp_path / "profile.json").exists()
+    assert (tmp_path / "profile.trace.json").exists()
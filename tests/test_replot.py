@@ -0,0 +1,41 @@
+import json
+
+import numpy as np
+
+from MatrixData import load_data, row_labels
+from Replot import Replot
+import DarshanAPI
+
+
+def test_save_data_replot(tmp_path, synthetic_files):
+    (f,) = synthetic_files(seed=2, nprocs=16, nfiles=4, nhosts=2, segments=30)
+    options = DarshanAPI.Options(
+        nbins=40, tstart=5.0, ops=["write"], top=5, top_other=True, verbose=False
+    )
+    logs = DarshanAPI.load(f.path, options, files=[f])
+    logs.set_feature_options(options)
+    logs.output = str(tmp_path / "saved")
+    matrices = [m for m in logs.bin_io() if m.group == "rank"]
+    assert len(matrices) == 1
+    saved = matrices[0]
+    saved.save_data(logs)
+
+    path = "{}_{}.npz".format(logs.output, saved.data_name())
+    replot = Replot([path, "-raster", "-output", str(tmp_path / "replot")])
+    m = replot.plot(path)
+
+    # the matrices
+    for k in ("mat", "mat_bw", "mat_bw_count", "mat_meta"):
+        a, b = getattr(saved, k).mat.toarray(), getattr(m, k).mat.toarray()
+        assert a.shape == b.shape and np.allclose(a, b), k
+    # the labels of the rows (the top ranks and the row of the others)
+    assert np.array_equal(m.rows, saved.rows) and m.other
+    labels = load_data(path)["labels"]
+    assert np.array_equal(labels, row_labels(logs, "rank", saved.rows))
+    # the time axis
+    for k in ("step", "tstart", "tend", "nbins"):
+        assert getattr(replot, k) == getattr(logs, k), k
+    with open(str(tmp_path / "replot_write_rank_bw.json")) as sidecar:
+        raster = json.load(sidecar)
+    assert raster["extent"] == [logs.tstart, logs.tend, 0, len(saved.rows) + 1]
+    assert raster["shape"] == list(saved.mat.mat.shape)
@@ -0,0 +1,25 @@
+import numpy as np
+
+from SegmentTable import SegmentTable, SEGMENT_COLUMNS, RECORD_COLUMNS
+
+
+def random_table(nseg, nrec, seed=0):
+    rng = np.random.default_rng(seed)
+    start = rng.random(nseg) * 100
+    segments = {k: rng.integers(0, 4, nseg) for k in SEGMENT_COLUMNS}
+    segments["record"] = rng.integers(0, nrec, nseg)
+    segments["start"] = start
+    segments["end"] = start + rng.exponential(2, nseg)
+    records = {k: rng.integers(0, 4, nrec).astype(t) for k, t in RECORD_COLUMNS.items()}
+    return SegmentTable(segments, records, np.arange(4, dtype=np.uint64), list("abcd"))
+
+
+def test_window():
+    table = random_table(5000, 30)
+    for tstart, tend in ((0, 100), (10.5, 20), (50, 50.1), (99, 200)):
+        window = table.window(tstart, tend)
+        mask = (table.start < tend) & (table.end >= tstart)
+        assert np.array_equal(window.record, table.record[mask])
+        assert np.allclose(window.start, table.start[mask] - tstart)
+        assert np.allclose(window.end, table.end[mask] - tstart)
+        assert window.nb_records() == table.nb_records()
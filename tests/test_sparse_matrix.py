@@ -0,0 +1,120 @@
+import os
+
+import numpy as np
+import pytest
+import scipy.sparse as sp
+
+from MatrixData import check_figure_options
+from SparseMatrix import downsample_rows
+
+
+def test_downsample_rows():
+    rng = np.random.default_rng(0)
+    dense = rng.integers(0, 5, size=(1000, 7)) * (rng.random((1000, 7)) < 0.1)
+    mat = sp.coo_matrix(dense)
+
+    array, row_groups = downsample_rows(mat, 2000, "sum")
+    assert row_groups is None
+    assert np.array_equal(array, dense)
+
+    bounds = np.append(downsample_rows(mat, 300, "sum")[1], len(dense))
+    assert bounds[0] == 0 and len(bounds) == 301
+    for method, reduce in (("sum", np.sum), ("max", np.max), ("mean", np.mean)):
+        array, row_groups = downsample_rows(mat, 300, method)
+        assert array.shape == (300, 7)
+        for i in range(300):
+            expected = reduce(dense[bounds[i] : bounds[i + 1]], axis=0)
+            assert np.allclose(array[i], expected)
+
+
+def test_normalize():
+    import matplotlib.colors as mc
+
+    from SparseMatrix import normalize
+
+    rng = np.random.default_rng(0)
+    array = rng.random((20, 30)) * 100 * (rng.random((20, 30)) < 0.5)
+    vmax = 90
+    for norm, reference in (
+        ("linear", mc.Normalize(vmin=0, vmax=vmax)),
+        ("log", mc.LogNorm(vmin=array[array > 0].min(), vmax=vmax)),
+        ("symlog", mc.SymLogNorm(2, linscale=1, base=10, vmin=0, vmax=vmax)),
+    ):
+        scaled, vmin = normalize(array, norm, vmax)
+        if norm == "log":
+            expected = reference(np.ma.masked_less_equal(array, 0))
+        else:
+            expected = reference(array)
+        assert np.ma.allclose(scaled, np.ma.clip(expected, 0, 1))
+
+
+def test_top_rows():
+    from SparseMatrix import top_rows, select_entries
+
+    rng = np.random.default_rng(0)
+    x = rng.integers(0, 1000, size=5000)
+    # (integer weights, so that there are ties between the totals)
+    weights = rng.integers(0, 3, size=5000).astype(np.float64)
+    totals = np.bincount(x, weights=weights, minlength=1200)
+    expected = np.lexsort((np.arange(1200), -totals))[:20]
+
+    rows = top_rows(x, weights, 1200, 20)
+    assert np.array_equal(rows, expected)
+    assert top_rows(x, weights, 1200, 1200) is None
+
+    new_x, keep = select_entries(x, rows, 1200)
+    assert np.array_equal(rows[new_x], x[keep])
+    new_x, keep = select_entries(x, rows, 1200, other=True)
+    assert keep.all()
+    assert np.isclose(weights[new_x == 20].sum(), totals.sum() - totals[rows].sum())
+
+
+def test_check_figure_options():
+    check_figure_options("asinh", "none")
+    check_figure_options("symlog", "max", raster=True)
+    for norm, downsample, raster in (
+        ("lg", "sum", False),
+        ("logit", "sum", True),
+        ("log", "avg", False),
+    ):
+        with pytest.raises(SystemExit):
+            check_figure_options(norm, downsample, raster)
+
+
+def test_write_raster(tmp_path):
+    import json
+
+    from SparseMatrix import write_raster
+
+    for nrows in (0, 3):
+        mat = sp.coo_matrix(np.arange(nrows * 5).reshape(nrows, 5))
+        filename = str(tmp_path / "raster_{}".format(nrows))
+        write_raster(mat, filename, "title", [0, 5, 0, nrows], "log", None, "sum")
+        with open(filename + ".json") as sidecar:
+            image = json.load(sidecar)["image"]
+        # a matrix without rows has no image
+        assert os.path.exists(filename + ".png") == (nrows != 0)
+        assert image == (filename + ".png" if nrows != 0 else None)
+
+
+def test_log_downsample(capsys):
+    from SparseMatrix import log_downsample
+
+    class Info:
+        downsample = "max"
+
+        def __init__(self):
+            self.messages = list()
+
+        def log(self, message):
+            self.messages.append(message)
+
+    info = Info()
+    mat = sp.coo_matrix(np.ones((1000, 4)))
+    log_downsample(info, 1000, downsample_rows(mat, 2000, "max")[1])
+    log_downsample(info, 1000, downsample_rows(mat, 300, "max")[1])
+    # the message is only given to info.log, downsample_rows doesn't print it
+    assert capsys.readouterr().out == ""
+    assert info.messages == [
+        "Downsample 1000 rows to 300 rows (groups of 3 to 4 rows, max)"
+    ]
@@ -0,0 +1,51 @@
+import numpy as np
+
+import DarshanAPI
+
+
+def stream_report(monkeypatch, report):
+    """
+    Replaces the reader of pydarshan by the DXT_POSIX records of report, with a record that has no name record
+    """
+    import darshan.backend.cffi_backend as backend
+
+    records = list(report.records["DXT_POSIX"])
+    unnamed = dict(records[0], id=1)
+    records.insert(len(records) // 2, unnamed)
+    names = {
+        rec["id"]: "/file/{}".format(rec["id"]) for rec in records if rec is not unnamed
+    }
+    iterator = dict()
+
+    def log_open(path):
+        iterator[path] = iter(records)
+        return path
+
+    monkeypatch.setattr(backend, "log_open", log_open)
+    monkeypatch.setattr(backend, "log_get_name_records", lambda log: names)
+    monkeypatch.setattr(
+        backend, "log_get_dxt_record", lambda log, mod: next(iterator[log], None)
+    )
+    monkeypatch.setattr(backend, "log_close", lambda log: None)
+
+
+def binned(synthetic_files, stream):
+    # (a new file for each reading, the DXT_POSIX records of a file that is read are not streamed again)
+    (f,) = synthetic_files(seed=3, nprocs=16, nfiles=4, nhosts=2, segments=30)
+    options = DarshanAPI.Options(nbins=40, stream=stream, verbose=False)
+    logs = DarshanAPI.load(f.path, options, files=[f])
+    return DarshanAPI.bin_io(logs, options), DarshanAPI.ranks_per_file(logs, options)
+
+
+def test_streaming(monkeypatch, synthetic_files):
+    (f,) = synthetic_files(seed=3, nprocs=16, nfiles=4, nhosts=2, segments=30)
+    stream_report(monkeypatch, f.report)
+    expected = binned(synthetic_files, None)
+    # (a chunk of one record, chunks of several records and a single chunk)
+    for stream in (1, 5, 1000):
+        for one, other in zip(expected, binned(synthetic_files, stream)):
+            for k, b in one.items():
+                assert np.array_equal(b.labels, other[k].labels), (stream, k)
+                for name, data in b.data.items():
+                    streamed = other[k].data[name].toarray()
+                    assert np.allclose(data.toarray(), streamed), (stream, k, name)
@@ -0,0 +1,27 @@
+import os
+
+import numpy as np
+
+from DarshanInfo import DarshanInfo
+
+
+def test_synthetic_features(tmp_path, monkeypatch, synthetic_files):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("output")
+    (f,) = synthetic_files(nprocs=32, nfiles=8, nhosts=4, segments=40, skew=5.0)
+    info = DarshanInfo(["main.py", f.path, "-raster"], files=[f])
+
+    info.argv = ["main.py", f.path, "aggregate_info", "write"]
+    info.i = 2
+    info.aggregate_info()
+    (write,) = info.matrix
+    table = f.segments
+    assert np.isclose(write.v_bw.sum(), table.length[table.op_mask("write")].sum())
+
+    info.argv = ["main.py", f.path, "nb_rank_file", "read"]
+    info.i = 2
+    info.nb_rank_file()
+    (read,) = info.matrix
+    # each rank reads a single file, so a bin has at most nprocs / nfiles ranks per file
+    assert read.mat.max() <= 4
+    assert read.mat.sum() > 0